@@ -0,0 +1,74 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+
+class _Mailbox:
+    __slots__ = ("items", "ready", "task")
+
+    def __init__(self):
+        self.items: Deque[Tuple[Callable[..., Awaitable[Any]], Tuple[Any, ...], asyncio.Future]] = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class GameActors:
+    """Почтовые ящики игр: действия с одной игрой выполняются строго по очереди
+
+    Для каждой живой игры заводится своя задача-обработчик. Она создается
+    при первом сообщении и завершается, если idle_timeout секунд ничего
+    не приходило. Разные игры обрабатываются параллельно, без общих блокировок.
+    Действие не должно само ждать call() для той же игры - это взаимная блокировка.
+    """
+
+    def __init__(self, idle_timeout: float = 60.0):
+        self.idle_timeout = idle_timeout
+        self._mailboxes: Dict[Hashable, _Mailbox] = {}
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    async def call(self, key: Hashable, action: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Ставим действие в очередь игры и ждем его результата"""
+        mailbox = self._mailboxes.get(key)
+        if mailbox is None:
+            mailbox = self._mailboxes[key] = _Mailbox()
+            mailbox.task = asyncio.create_task(self._consume(key, mailbox))
+        future = asyncio.get_running_loop().create_future()
+        mailbox.items.append((action, args, future))
+        mailbox.ready.set()
+        # Отмена ожидающего не прерывает уже начатое действие
+        return await asyncio.shield(future)
+
+    async def _consume(self, key: Hashable, mailbox: _Mailbox):
+        future: Optional[asyncio.Future] = None
+        try:
+            while True:
+                if not mailbox.items:
+                    mailbox.ready.clear()
+                    try:
+                        await asyncio.wait_for(mailbox.ready.wait(), self.idle_timeout)
+                    except asyncio.TimeoutError:
+                        # Между проверкой и удалением нет await: новое сообщение не потеряется
+                        if not mailbox.items:
+                            del self._mailboxes[key]
+                            return
+                    continue
+                action, args, future = mailbox.items.popleft()
+                try:
+                    result = await action(*args)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        except BaseException:
+            # Обработчик отменен или убит: ящик больше никто не разберет.
+            # Убираем его, чтобы следующий call() завел новый, а ждущих не оставляем висеть
+            if self._mailboxes.get(key) is mailbox:
+                del self._mailboxes[key]
+            pending = [item[2] for item in mailbox.items]
+            mailbox.items.clear()
+            for waiter in [future, *pending]:
+                if waiter is not None and not waiter.done():
+                    waiter.cancel()
+            raise
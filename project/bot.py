@@ -4,11 +4,13 @@ import random
 import aiohttp
 import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+import re
+import time
+from urllib.parse import quote
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command, StateFilter
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -21,9 +23,37 @@ from aiogram.types import (
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties 
 
+import fuzzy
+from actors import GameActors
+from facts import FactsBundle
+from flood import FloodControl
+from games import Game, MultiGame, SingleGame, record_index
+from outbound import PRIORITY_SUMMARY, OutboundScheduler, priority
+from prefetch import Prefetcher
+from registry import GameRegistry
+from sessions import NEW, RedisSessionStore, SessionFSMStorage, SessionStore
+from snapshots import SnapshotSessionStore
+from stats_store import StatsStore
+from search_pool import SearchPool
+from strategy import MoveEngine
+from timers import DeadlineScheduler
+from users import UserDirectory
+from webhook import WebhookServer
+from wiki_cache import WikiCache
+from dictionary import (
+    BaseCityDictionary,
+    CityDictionary,
+    CityPool,
+    MappedCityDictionary,
+    DEFAULT_CITIES,
+    normalize,
+    read_city_names,
+    read_city_scores,
+    write_compiled
+)
+
 # Настройка логов
 logging.basicConfig(
     level=logging.INFO,
@@ -38,32 +68,94 @@ logger = logging.getLogger(__name__)
 # Конфигурация
 TOKEN = "7477794349:AAGQ6A1R9VY-M1HbpoxISKNyqjyt6xiKMYw" 
 CITIES_FILE = "cities.txt"
+CITIES_BIN = "cities.bin"  # Собирается командой: python compile_cities.py
+CITY_SCORES_FILE = "city_scores.txt"  # Популярность городов для порядка подсказок
+HINTS_COUNT = 5
 FAKE_CITIES = ["Квантоград", "Нейросбург", "Киберполис", "Алгоритмск", "Датоград"]
 MAX_CITIES_IN_GAME = 200  # Лимит городов в одной игре
+MULTI_TURN_TIME = 120  # 2 минуты на ход в мультиплеере
+INVITE_TTL = 600  # Сколько ждем принятия приглашения (сек)
+MOVE_BUDGET = 0.003  # Время на поиск хода бота в цикле событий (сек)
+MOVE_WORKERS = int(os.getenv("MOVE_WORKERS", "2"))  # Процессы для поиска ходов (0 - искать на месте)
+SEARCH_BUDGET = 0.05  # Время на поиск хода в процессе-исполнителе (сек)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+CITIES_WATCH_INTERVAL = 30  # Как часто проверяем изменения cities.txt (сек)
+WIKI_API_URL = os.getenv("WIKI_API_URL", "https://ru.wikipedia.org/api/rest_v1/page/summary/")
+HTTP_POOL_SIZE = 20  # Максимум одновременных соединений наружу
+WIKI_CACHE_FILE = "wiki_cache.sqlite3"
+STATS_FILE = "stats.sqlite3"
+FACTS_FILE = "facts.bin"  # Собирается командой: python build_facts.py
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") == "1"  # Прогрев описаний после ходов
+REDIS_URL = os.getenv("REDIS_URL")  # Общее хранилище игр для нескольких воркеров
+SESSIONS_DIR = "state"  # Снимки и журнал игр, если Redis не используется
+DICTIONARY_HISTORY = 3  # Сколько версий словаря держим для уже начатых игр
+WEBHOOK_ENABLED = os.getenv("WEBHOOK", "0") == "1"  # Вебхук вместо long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес; без него вебхук не регистрируется
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))  # Обновлений в обработке одновременно
 
 class GameModes:
     SINGLE = "single"
     MULTI = "multi"
 
 # Загрузка городов
-def load_cities() -> List[str]:
-    default_cities = [
-        "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань",
-        "Нижний Новгород", "Челябинск", "Самара", "Омск", "Ростов-на-Дону",
-        "Уфа", "Красноярск", "Пермь", "Воронеж", "Волгоград"
-    ]
+def sources_mtime() -> Optional[float]:
+    """Время последнего изменения исходников словаря (названия и популярность)"""
+    mtimes = [os.path.getmtime(path) for path in (CITIES_FILE, CITY_SCORES_FILE) if os.path.exists(path)]
+    return max(mtimes, default=None)
+
+def load_cities() -> BaseCityDictionary:
+    # Скомпилированный словарь отображается в память и делится между процессами
+    mtime = sources_mtime()
+    if os.path.exists(CITIES_BIN) and (mtime is None or os.path.getmtime(CITIES_BIN) >= mtime):
+        try:
+            return MappedCityDictionary(CITIES_BIN)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки {CITIES_BIN}: {e}")
+    elif os.path.exists(CITIES_BIN):
+        logger.warning(f"{CITIES_BIN} устарел, читаем {CITIES_FILE}")
     
     if os.path.exists(CITIES_FILE):
         try:
-            with open(CITIES_FILE, encoding="utf-8") as f:
-                cities = [line.strip() for line in f if line.strip()]
-                return list(set(cities + default_cities))  # Удаляем дубликаты
+            return CityDictionary(  # Удаляем дубликаты
+                read_city_names(CITIES_FILE) + DEFAULT_CITIES, read_city_scores(CITY_SCORES_FILE)
+            )
         except Exception as e:
             logger.error(f"Ошибка загрузки городов: {e}")
-            return default_cities
-    return default_cities
+            return CityDictionary(DEFAULT_CITIES)
+    return CityDictionary(DEFAULT_CITIES)
+
+def rebuild_cities() -> BaseCityDictionary:
+    """Пересобираем словарь из cities.txt (вызывается вне цикла событий)"""
+    dictionary = CityDictionary(read_city_names(CITIES_FILE) + DEFAULT_CITIES, read_city_scores(CITY_SCORES_FILE))
+    try:
+        write_compiled(dictionary, CITIES_BIN)
+        return MappedCityDictionary(CITIES_BIN)
+    except OSError as e:
+        logger.warning(f"Не удалось записать {CITIES_BIN}, словарь остается в памяти: {e}")
+        return dictionary
 
 CITIES = load_cities()
+dictionaries: Dict[int, BaseCityDictionary] = {CITIES.fingerprint: CITIES}
+cities_reload_lock = asyncio.Lock()
+
+async def reload_cities() -> int:
+    """Горячая перезагрузка словаря без остановки бота"""
+    global CITIES
+    async with cities_reload_lock:
+        dictionary = await asyncio.to_thread(rebuild_cities)
+        await asyncio.to_thread(fuzzy.build_index, dictionary)
+        await asyncio.to_thread(engine.graph, dictionary)
+        await asyncio.to_thread(dictionary.name_model)
+        # Текущие игры помнят отпечаток своего словаря,
+        # поэтому подмена затрагивает только новые игры
+        register_dictionary(dictionary)
+        CITIES = dictionary
+    logger.info(f"Словарь перезагружен: {len(dictionary)} городов")
+    return len(dictionary)
 
 # Уровни сложности
 DIFFICULTIES = {
@@ -72,6 +164,7 @@ DIFFICULTIES = {
         "time": 60,
         "hints": True,
         "cheat_chance": 0,
+        "strategy": False,  # Ход ищет движок с перебором, а не случайный выбор
         "description": "Подсказки доступны, бот не мухлюет"
     },
     "medium": {
@@ -79,6 +172,7 @@ DIFFICULTIES = {
         "time": 45,
         "hints": False,
         "cheat_chance": 0,
+        "strategy": False,
         "description": "Без подсказок, стандартные правила"
     },
     "hard": {
@@ -86,6 +180,7 @@ DIFFICULTIES = {
         "time": 30,
         "hints": False,
         "cheat_chance": 0.05,
+        "strategy": True,
         "description": "Бот может подсунуть фейковый город (5% шанс)"
     }
 }
@@ -99,18 +194,42 @@ class GameState(StatesGroup):
     PLAYING_SINGLE = State()
     PLAYING_MULTI = State()
 
+# Хранилища данных
+session_store: SessionStore = RedisSessionStore(REDIS_URL) if REDIS_URL else SnapshotSessionStore(SESSIONS_DIR)
+stats_store = StatsStore(STATS_FILE)
+http_session: Optional[aiohttp.ClientSession] = None
+
+# Очереди действий по играм и индексы мультиплеерных игр
+actors = GameActors()
+registry = GameRegistry(session_store, INVITE_TTL)
+
 # Инициализация бота
-storage = MemoryStorage()
+storage = SessionFSMStorage(session_store)
 bot = Bot(
     token=TOKEN,
     default=DefaultBotProperties(parse_mode="HTML")
 )
 dp = Dispatcher(storage=storage)
+# Все исходящие запросы идут через общую очередь с лимитами Telegram
+outbound = OutboundScheduler()
+bot.session.middleware(outbound)
+def interrupt_search(message: Message):
+    """Сдача во время хода бота прерывает его поиск сразу
 
-# Хранилища данных
-user_sessions: Dict[int, Dict[str, Any]] = {}
-active_games: Dict[str, Dict[str, Any]] = {}
-user_stats: Dict[int, Dict[str, int]] = {}
+    Пока идет ход, следующее сообщение игрока ждет в антифлуде: внутри
+    обработчика отменять было бы уже нечего.
+    """
+    if message.text == "🏳 Сдаться":
+        cancel_search((GameModes.SINGLE, message.from_user.id))
+
+# Лимит входящих сообщений на пользователя со склейкой очереди
+flood_control = FloodControl(interrupt=interrupt_search)
+dp.message.outer_middleware(flood_control)
+# Справочник username -> id для приглашений
+user_directory = UserDirectory(session_store)
+dp.update.outer_middleware(user_directory)
+# Данные бота: запрашиваются один раз при запуске
+bot_user: Optional[types.User] = None
 
 # --- Утилиты ---
 def get_last_letter(city: str) -> str:
@@ -119,16 +238,59 @@ def get_last_letter(city: str) -> str:
     last_char = city[-1].lower()
     return city[-2].lower() if last_char in bad_letters else last_char
 
+# Движок ходов для сложного уровня: глубокий поиск идет в пуле процессов
+engine = MoveEngine(get_last_letter, MOVE_BUDGET)
+search_pool: Optional[SearchPool] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия с пулом keep-alive соединений и кешем DNS"""
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            ),
+            timeout=aiohttp.ClientTimeout(total=3)
+        )
+    return http_session
+
+async def fetch_wiki_summary(city: str) -> Optional[str]:
+    """Запрос к API Википедии: текст или None, если страницы нет"""
+    async with get_http_session().get(f"{WIKI_API_URL}{quote(city)}") as resp:
+        if resp.status == 404:
+            return None
+        resp.raise_for_status()
+        data = await resp.json()
+        return data.get("extract")
+
+def load_facts() -> Optional[FactsBundle]:
+    """Локальный пакет описаний, если он собран"""
+    if not os.path.exists(FACTS_FILE):
+        return None
+    try:
+        return FactsBundle(FACTS_FILE)
+    except Exception as e:
+        logger.error(f"Ошибка загрузки {FACTS_FILE}: {e}")
+        return None
+
+facts = load_facts()
+wiki_cache = WikiCache(fetch_wiki_summary, WIKI_CACHE_FILE)
+prefetcher = Prefetcher(wiki_cache.get)
+
+def prefetch_city(game_key: Any, city: str):
+    """Прогреваем описание города, о котором скорее всего спросят"""
+    if PREFETCH_ENABLED and not (facts and city in facts):
+        prefetcher.schedule(game_key, city)
+
 async def get_wiki_info(city: str) -> str:
-    """Получаем информацию о городе из Википедии"""
+    """Получаем информацию о городе: сначала локально, потом из Википедии"""
+    info = facts.get(city) if facts else None
+    if info:
+        return info
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"https://ru.wikipedia.org/api/rest_v1/page/summary/{city}",
-                timeout=3
-            ) as resp:
-                data = await resp.json()
-                return data.get("extract", "Информация не найдена")
+        return await wiki_cache.get(city) or "Информация не найдена"
     except Exception as e:
         logger.error(f"Ошибка Wikipedia: {e}")
         return "Не удалось получить информацию"
@@ -143,15 +305,14 @@ def generate_fake_info(city: str) -> str:
     ]
     return random.choice(facts)
 
-def create_fake_city() -> str:
-    """Генерируем название фейкового города"""
-    prefixes = ["Ново", "Верхне", "Нижне", "Старо", "Бело"]
-    suffixes = ["град", "бург", "поль", "донск", "горск"]
-    return random.choice(prefixes) + random.choice(suffixes)
-
-def is_valid_city(city: str, last_letter: str, used_cities: List[str]) -> bool:
-    """Проверяем валидность города"""
-    return (city in CITIES or city in FAKE_CITIES) and city not in used_cities and city[0].lower() == last_letter.lower()
+def unknown_city_text(city: str, letter: str, pool: CityPool) -> str:
+    """Ответ на незнакомый город с вариантами исправления опечатки"""
+    index = fuzzy.get_index(pool.dictionary)
+    suggestions = index.suggest(city, letter, pool) if index else []
+    if not suggestions:
+        return "Я не знаю такого города!"
+    options = ", ".join(f"<b>{s}</b>" for s in suggestions)
+    return f"Я не знаю такого города! Возможно, вы имели в виду: {options}?"
 
 # --- Клавиатуры ---
 def main_menu_kb() -> ReplyKeyboardMarkup:
@@ -182,11 +343,13 @@ def game_kb(hints: bool = False) -> ReplyKeyboardMarkup:
     builder.button(text="❓ Что за город?")
     return builder.as_markup(resize_keyboard=True)
 
-def hint_kb(letter: str, cities: List[str]) -> InlineKeyboardMarkup:
+def hint_kb(pool: CityPool, ids: List[int]) -> InlineKeyboardMarkup:
     """Инлайн-клавиатура с подсказками"""
     builder = InlineKeyboardBuilder()
-    for city in cities[:5]:  # Показываем первые 5 вариантов
-        builder.button(text=city, callback_data=f"hint_{city}")
+    for idx in ids:
+        # В callback_data id, а не название: длинное название не влезет в 64 байта
+        builder.button(text=pool.dictionary.name(idx), callback_data=f"hint_{idx}")
+    builder.adjust(1)
     return builder.as_markup()
 
 # --- Основные обработчики ---
@@ -206,6 +369,45 @@ async def cmd_start(message: Message, state: FSMContext):
     )
     logger.info(f"Пользователь {message.from_user.id} запустил бота")
 
+@dp.message(Command("reload_cities"))
+async def cmd_reload_cities(message: Message):
+    """Перезагрузка словаря городов (только для админов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    try:
+        count = await reload_cities()
+    except Exception as e:
+        logger.error(f"Ошибка перезагрузки словаря: {e}")
+        await message.answer(f"❌ Не удалось перезагрузить словарь: {e}")
+        return
+    await message.answer(f"✅ Словарь перезагружен: {count} городов")
+
+@dp.message(Command("cache_stats"))
+async def cmd_cache_stats(message: Message):
+    """Счетчики кеша Википедии (только для админов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    stats = wiki_cache.stats
+    await message.answer(
+        f"📚 Кеш Википедии\n"
+        f"Попаданий в память: {stats['hits']}\n"
+        f"Дождались идущей загрузки: {stats['joined']}\n"
+        f"Попаданий на диск: {stats['disk_hits']}\n"
+        f"Промахов: {stats['misses']}"
+    )
+
+@dp.message(Command("flood_stats"))
+async def cmd_flood_stats(message: Message):
+    """Счетчики защиты от флуда (только для админов)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    stats = flood_control.stats
+    await message.answer(
+        f"🌊 Защита от флуда\n"
+        f"Отброшено по лимиту: {stats['dropped']}\n"
+        f"Вытеснено более новыми: {stats['merged']}"
+    )
+
 @dp.message(StateFilter(GameState.MAIN_MENU), lambda m: m.text == "🎮 Одиночная игра")
 async def singleplayer_mode(message: Message, state: FSMContext):
     """Выбор одиночной игры"""
@@ -230,7 +432,7 @@ async def multiplayer_mode(message: Message, state: FSMContext):
 @dp.message(StateFilter(GameState.MAIN_MENU), lambda m: m.text == "📊 Статистика")
 async def show_stats(message: Message):
     """Показ статистики игрока"""
-    stats = user_stats.get(message.from_user.id, {"wins": 0, "losses": 0})
+    stats = await stats_store.get(message.from_user.id)
     await message.answer(
         f"📊 <b>Ваша статистика</b>\n\n"
         f"🏆 Побед: {stats['wins']}\n"
@@ -278,20 +480,21 @@ async def set_difficulty(message: Message, state: FSMContext):
         return
     
     user_id = message.from_user.id
-    user_sessions[user_id] = {
-        "mode": GameModes.SINGLE,
-        "difficulty": diff_name,
-        "used": [],
-        "score": {"player": 0, "bot": 0},
-        "last_move": datetime.now(),
-        "cheated": False,
-        "turn_count": 0
-    }
+    await actors.call((GameModes.SINGLE, user_id), start_single_game, message, state, diff_name)
+
+async def start_single_game(message: Message, state: FSMContext, diff_name: str):
+    """Новая одиночная игра (в очереди игры игрока)"""
+    user_id = message.from_user.id
     
     # Первый ход бота
-    city = random.choice(CITIES)
-    user_sessions[user_id]["used"].append(city)
-    user_sessions[user_id]["score"]["bot"] += 1
+    game = SingleGame(CityPool(CITIES), diff_name)
+    city = CITIES.random_city()
+    game.play(city)
+    game.bot_score = 1
+    game.set_timer(DIFFICULTIES[diff_name]["time"])
+    await session_store.put(session_key(user_id), game.to_record())
+    deadlines.schedule((GameModes.SINGLE, user_id), game.time_left())
+    prefetch_city(user_id, city)
     
     await state.set_state(GameState.PLAYING_SINGLE)
     await message.answer(
@@ -308,43 +511,70 @@ async def set_difficulty(message: Message, state: FSMContext):
 async def game_process(message: Message, state: FSMContext):
     """Обработка хода в одиночной игре"""
     user_id = message.from_user.id
-    session = user_sessions.get(user_id)
+    if message.text == "🏳 Сдаться":
+        # Ход из подсказки идет мимо антифлуда: его поиск может еще идти
+        cancel_search((GameModes.SINGLE, user_id))
+    await actors.call((GameModes.SINGLE, user_id), single_turn, message, state, user_id, message.text)
+
+@dp.callback_query(F.data.startswith("hint_"), StateFilter(GameState.PLAYING_SINGLE))
+async def hint_chosen(callback: CallbackQuery, state: FSMContext):
+    """Игрок выбрал город из подсказки"""
+    await callback.answer()
+    user_id = callback.from_user.id
+    idx = callback.data.removeprefix("hint_")
+    if idx.isdigit():
+        await actors.call((GameModes.SINGLE, user_id), hint_turn, callback.message, state, user_id, int(idx))
+
+@dp.callback_query(F.data.startswith("hint_"))
+async def stale_hint(callback: CallbackQuery):
+    """Подсказка из уже законченной игры"""
+    await callback.answer("Игра уже закончилась")
+
+async def hint_turn(message: Message, state: FSMContext, user_id: int, idx: int):
+    """Ход городом из подсказки (в очереди игры)"""
+    game, _ = await load_single_game(user_id)
+    # id относится к словарю игры; устаревшую подсказку отклонит обычная проверка хода
+    if game and idx < len(game.pool.dictionary):
+        await single_turn(message, state, user_id, game.pool.dictionary.name(idx))
+
+async def single_turn(message: Message, state: FSMContext, user_id: int, text: str):
+    """Ход в одиночной игре (в очереди игры)"""
+    game, version = await load_single_game(user_id)
     
-    if not session:
+    if not game:
         await message.answer("Сессия не найдена. Начните заново /start")
         return
     
-    # Обновляем время последнего хода
-    session["last_move"] = datetime.now()
-    session["turn_count"] += 1
+    # Переносим дедлайн хода
+    difficulty = DIFFICULTIES[game.difficulty]
+    game.set_timer(difficulty["time"])
+    game.turn_count += 1
     
     # Обработка специальных команд
-    if message.text == "🏳 Сдаться":
+    if text == "🏳 Сдаться":
         await end_single_game(user_id, "Вы сдались")
         await state.set_state(GameState.MAIN_MENU)
         return
     
-    if message.text == "💡 Подсказка" and DIFFICULTIES[session["difficulty"]]["hints"]:
-        last_letter = get_last_letter(session["used"][-1])
-        available = [c for c in CITIES 
-                    if c[0].lower() == last_letter
-                    and c not in session["used"]]
+    if text == "💡 Подсказка" and difficulty["hints"]:
+        if not await save_single_game(message, user_id, game, version):
+            return
+        available = game.pool.hint_ids(get_last_letter(game.last), HINTS_COUNT)
         if available:
             await message.answer(
                 "Возможные города:",
-                reply_markup=hint_kb(last_letter, available)
+                reply_markup=hint_kb(game.pool, available)
             )
         else:
             await message.answer("Нет доступных подсказок")
         return
     
-    if message.text == "❓ Что за город?":
-        if not session["used"]:
-            await message.answer("Еще нет названных городов")
+    if text == "❓ Что за город?":
+        if not await save_single_game(message, user_id, game, version):
             return
         
-        last_city = session["used"][-1]
-        if session["cheated"] and last_city in FAKE_CITIES:
+        last_city = game.last
+        if game.cheated and last_city not in game.pool.dictionary:
             info = generate_fake_info(last_city)
             await message.answer(
                 f"📖 {last_city}\n{info}\n\n"
@@ -356,80 +586,95 @@ async def game_process(message: Message, state: FSMContext):
             await message.answer(f"📖 {last_city}\n{info}")
         return
     
-    if message.text.lower() in ["фейк", "обман"]:
-        if session.get("cheated", False):
+    if text.lower() in ["фейк", "обман"]:
+        if game.cheated:
             await message.answer(
                 "🎉 Вы поймали бота на обмане! Победа за вами!\n"
-                f"Фейковый город: <b>{session['used'][-1]}</b>",
+                f"Фейковый город: <b>{game.last}</b>",
                 reply_markup=main_menu_kb(),
                 parse_mode="HTML"
             )
             update_stats(user_id, True)
+            await discard_single_game(user_id)
             await state.set_state(GameState.MAIN_MENU)
-        else:
+        elif await save_single_game(message, user_id, game, version):
             await message.answer("Это реальный город! Продолжайте игру")
         return
     
     # Проверка города игрока
-    city = message.text.strip().capitalize()
-    last_city = session["used"][-1]
-    required_letter = get_last_letter(last_city)
+    pool = game.pool
+    cities = pool.dictionary
+    # Один поиск в словаре: дальше город известен по id
+    idx, city = cities.resolve(text) or (None, text.strip().capitalize())
+    required_letter = get_last_letter(game.last)
     
-    if city in session["used"]:
-        await message.answer("Этот город уже был!")
-        return
-        
-    if city[0].lower() != required_letter:
-        await message.answer(f"Нужен город на букву <b>{required_letter.upper()}</b>!", parse_mode="HTML")
-        return
-        
-    if city not in CITIES and city not in FAKE_CITIES:
-        await message.answer("Я не знаю такого города!")
+    error = None
+    if pool.is_named(idx, city):
+        error = "Этот город уже был!"
+    elif normalize(city)[0] != normalize(required_letter):
+        error = f"Нужен город на букву <b>{required_letter.upper()}</b>!"
+    elif idx is None and city not in FAKE_CITIES:
+        error = unknown_city_text(city, required_letter, pool)
+    if error:
+        if await save_single_game(message, user_id, game, version):
+            await message.answer(error, parse_mode="HTML")
         return
     
     # Ход принят
-    session["used"].append(city)
-    session["score"]["player"] += 1
+    game.play(city, idx)
+    game.player_score += 1
     
     # Проверка на победу (если использованы все города)
-    if len(session["used"]) >= MAX_CITIES_IN_GAME:
-        await end_single_game(user_id, "Достигнут лимит городов")
-        await state.set_state(GameState.MAIN_MENU)
+    if len(pool) >= MAX_CITIES_IN_GAME:
+        if await save_single_game(message, user_id, game, version):
+            await end_single_game(user_id, "Достигнут лимит городов")
+            await state.set_state(GameState.MAIN_MENU)
         return
     
     # Ход бота
     last_letter = get_last_letter(city)
-    available = [c for c in CITIES 
-                if c not in session["used"] 
-                and c[0].lower() == last_letter]
+    remaining = pool.remaining(last_letter)
+    fake_city = None
     
     # Проверка на блеф (на сложном уровне после 3 ходов)
-    if (random.random() < DIFFICULTIES[session["difficulty"]]["cheat_chance"] 
-            and session["turn_count"] > 3):
-        fake_city = create_fake_city()
-        available.append(fake_city)
-        session["cheated"] = True
+    if random.random() < difficulty["cheat_chance"] and game.turn_count > 3:
+        # Название сочиняет модель словаря: нужная буква, настоящего такого города нет
+        fake_city = cities.fake_city(last_letter)
+        if fake_city and pool.is_used(fake_city):
+            fake_city = None
+        game.cheated = game.cheated or fake_city is not None
     
-    if not available:
+    if not remaining and not fake_city:
         await message.answer(
             "🎉 Вы победили! У меня нет городов на эту букву.\n"
-            f"📊 Счет: {session['score']['player']}-{session['score']['bot']}",
+            f"📊 Счет: {game.player_score}-{game.bot_score}",
             reply_markup=main_menu_kb()
         )
         update_stats(user_id, True)
+        await discard_single_game(user_id)
         await state.set_state(GameState.MAIN_MENU)
         return
     
-    bot_city = random.choice(available)
-    session["used"].append(bot_city)
-    session["score"]["bot"] += 1
+    # Фейк выбирается с той же вероятностью, что и любой реальный город
+    if fake_city and random.randrange(remaining + 1) == 0:
+        bot_city = fake_city
+    else:
+        bot_city = await bot_move(user_id, pool, last_letter, difficulty)
+        if bot_city is None:
+            return  # Игра закончилась, пока искали ход
+    game.play(bot_city)
+    game.bot_score += 1
+    if not await save_single_game(message, user_id, game, version):
+        return
+    if bot_city != fake_city:
+        prefetch_city(user_id, bot_city)
     
     await message.answer(
         f"✅ Принято: <b>{city}</b>\n"
         f"🤖 Мой город: <b>{bot_city}</b>\n"
         f"📌 Вам на букву: <b>{get_last_letter(bot_city).upper()}</b>\n\n"
-        f"📊 Счет: Вы {session['score']['player']} - {session['score']['bot']} Бот",
-        reply_markup=game_kb(DIFFICULTIES[session["difficulty"]]["hints"]),
+        f"📊 Счет: Вы {game.player_score} - {game.bot_score} Бот",
+        reply_markup=game_kb(difficulty["hints"]),
         parse_mode="HTML"
     )
 
@@ -440,32 +685,34 @@ async def process_player2(message: Message, state: FSMContext):
     try:
         if message.forward_from:
             player2 = message.forward_from.id
+            invitee = message.forward_from.username or str(player2)
         else:
-            player2 = message.text.strip().lstrip("@")
+            invitee = message.text.strip().lstrip("@")
+            # Username ищем в локальном справочнике: Bot API по нему не пишет
+            player2 = int(invitee) if invitee.isdigit() else await user_directory.resolve(invitee)
     except Exception as e:
         logger.error(f"Ошибка обработки игрока 2: {e}")
         await message.answer("Неверный формат. Пришлите @username или перешлите сообщение")
         return
     
-    # Проверка что это не сам бот
-    if str(player2) == str((await bot.get_me()).id):
+    if player2 is None:
+        await message.answer(
+            f"Игрок @{invitee} еще не писал боту.\n"
+            "Попросите его отправить боту /start и пригласите снова"
+        )
+        return
+    
+    # Проверка что это не сам бот и не сам игрок
+    if player2 in (bot_user.id, message.from_user.id):
         await message.answer("Нельзя играть с самим собой!")
         return
     
-    # Создаем игру
-    game_id = str(random.randint(1000, 9999))
-    active_games[game_id] = {
-        "player1": message.from_user.id,
-        "player2": player2,
-        "used": [],
-        "scores": {
-            str(message.from_user.id): 0,
-            str(player2): 0
-        },
-        "current_turn": player2,  # Первый ход у приглашенного
-        "last_move": datetime.now(),
-        "started": False
-    }
+    # Создаем игру (запись с версией NEW не перезапишет чужую игру с тем же ID)
+    game = MultiGame(CityPool(CITIES), message.from_user.id, player2)
+    game_id = await registry.new_id()
+    while not await session_store.save(game_key(game_id), game.to_record(), NEW):
+        game_id = await registry.new_id()
+    registry.add_pending(game_id, message.from_user.id, player2)
     
     # Отправляем приглашение
     try:
@@ -482,7 +729,7 @@ async def process_player2(message: Message, state: FSMContext):
             parse_mode="HTML"
         )
         await message.answer(
-            f"✅ Приглашение отправлено игроку @{player2}\n"
+            f"✅ Приглашение отправлено игроку @{invitee}\n"
             f"Ожидаем подтверждения...\n\n"
             f"ID игры: <code>{game_id}</code>",
             parse_mode="HTML"
@@ -493,44 +740,59 @@ async def process_player2(message: Message, state: FSMContext):
             "❌ Не удалось отправить приглашение\n"
             "Проверьте username или ID игрока"
         )
+        registry.remove(game_id)
+        await session_store.delete(game_key(game_id))
         await state.set_state(GameState.MAIN_MENU)
 
-@dp.message(Command("join"))
-async def join_game(message: Message, state: FSMContext):
-    """Обработка входа в игру"""
-    try:
-        game_id = message.text.split()[1]
-    except IndexError:
+@dp.message(Command("join", re.compile(r"join_([0-9a-z]+)")))
+async def join_game(message: Message, state: FSMContext, command: CommandObject):
+    """Обработка входа в игру: /join ID или /join_ID из приглашения"""
+    if command.regexp_match:
+        game_id = command.regexp_match.group(1)
+    elif command.args:
+        game_id = command.args.split()[0].lower()
+    else:
         await message.answer("Используйте: /join [ID_игры]")
         return
     
-    if game_id not in active_games:
+    await actors.call((GameModes.MULTI, game_id), start_multiplayer_game, message, state, game_id)
+
+async def start_multiplayer_game(message: Message, state: FSMContext, game_id: str):
+    """Начало мультиплеерной игры (в очереди игры)"""
+    game, version = await load_multiplayer_game(game_id)
+    if not game:
         await message.answer("Игра не найдена или уже завершена")
         return
     
-    game = active_games[game_id]
     player2 = str(message.from_user.id)
     
-    if player2 != str(game["player2"]):
+    if player2 != str(game.player2):
         await message.answer("Вы не являетесь приглашенным игроком")
         return
     
-    if game["started"]:
+    if game.started:
         await message.answer("Игра уже началась")
         return
     
     # Начинаем игру
-    game["started"] = True
-    first_city = random.choice(CITIES)
-    game["used"].append(first_city)
+    game.started = True
+    first_city = game.pool.dictionary.random_city()
+    game.play(first_city)
+    game.set_timer(MULTI_TURN_TIME)
+    if not await session_store.save(game_key(game_id), game.to_record(), version):
+        await message.answer("Игра уже началась")
+        return
+    registry.start(game_id)
+    deadlines.schedule((GameModes.MULTI, game_id), game.time_left())
+    prefetch_city(game_id, first_city)
     
     # Сохраняем сессии
-    user_sessions[game["player1"]] = {"game_id": game_id}
-    user_sessions[player2] = {"game_id": game_id}
+    await session_store.put(session_key(game.player1), {"game_id": game_id})
+    await session_store.put(session_key(player2), {"game_id": game_id})
     
     # Уведомляем игроков
     await bot.send_message(
-        game["player1"],
+        game.player1,
         f"🎮 Игра #{game_id} началась!\n"
         f"Первый город: <b>{first_city}</b>\n"
         f"Следующий ход - у соперника",
@@ -547,19 +809,24 @@ async def join_game(message: Message, state: FSMContext):
     )
     
     await state.set_state(GameState.PLAYING_MULTI)
+    await player_state(game.player1).set_state(GameState.PLAYING_MULTI)
 
 @dp.message(StateFilter(GameState.PLAYING_MULTI))
 async def multiplayer_turn(message: Message, state: FSMContext):
     """Обработка хода в мультиплеере"""
     user_id = message.from_user.id
-    session = user_sessions.get(user_id)
+    session, _ = await session_store.load(session_key(user_id))
     
-    if not session or "game_id" not in session:
+    if not isinstance(session, dict) or "game_id" not in session:
         await message.answer("Сессия не найдена. Начните заново /start")
         return
     
-    game_id = session["game_id"]
-    game = active_games.get(game_id)
+    await actors.call((GameModes.MULTI, session["game_id"]), multiplayer_move, message, state, session["game_id"])
+
+async def multiplayer_move(message: Message, state: FSMContext, game_id: str):
+    """Ход в мультиплеере (в очереди игры): ходы, сдача и таймаут идут по порядку"""
+    user_id = message.from_user.id
+    game, version = await load_multiplayer_game(game_id)
     
     if not game:
         await message.answer("Игра не найдена")
@@ -567,65 +834,66 @@ async def multiplayer_turn(message: Message, state: FSMContext):
         return
     
     # Проверяем, чей сейчас ход
-    if str(user_id) != str(game["current_turn"]):
+    if str(user_id) != str(game.current_turn):
         await message.answer("Сейчас не ваш ход!")
         return
     
     # Обновляем таймер
-    game["last_move"] = datetime.now()
+    game.set_timer(MULTI_TURN_TIME)
     
     # Обработка спецкоманд
     if message.text == "🏳 Сдаться":
-        winner_id = game["player2"] if user_id == game["player1"] else game["player1"]
-        await end_multiplayer_game(game_id, winner_id, "игрок сдался")
+        await end_multiplayer_game(game_id, game.opponent(user_id), "игрок сдался")
         await state.set_state(GameState.MAIN_MENU)
         return
     
     if message.text == "❓ Что за город?":
-        if not game["used"]:
+        if not await save_multiplayer_game(message, game_id, game, version):
+            return
+        if not game.last:
             await message.answer("Еще нет названных городов")
             return
         
-        last_city = game["used"][-1]
-        info = await get_wiki_info(last_city)
-        await message.answer(f"📖 {last_city}\n{info}")
+        info = await get_wiki_info(game.last)
+        await message.answer(f"📖 {game.last}\n{info}")
         return
     
     # Проверка города
-    city = message.text.strip().capitalize()
-    last_city = game["used"][-1] if game["used"] else ""
+    pool = game.pool
+    cities = pool.dictionary
+    idx, city = cities.resolve(message.text) or (None, message.text.strip().capitalize())
+    last_city = game.last or ""
     
-    if city in game["used"]:
-        await message.answer("Этот город уже был!")
-        return
-        
-    if game["used"] and city[0].lower() != get_last_letter(last_city):
-        await message.answer(
-            f"Нужен город на букву <b>{get_last_letter(last_city).upper()}</b>!",
-            parse_mode="HTML"
-        )
-        return
-        
-    if city not in CITIES:
-        await message.answer("Я не знаю такого города!")
+    error = None
+    if pool.is_named(idx, city):
+        error = "Этот город уже был!"
+    elif game.last and normalize(city)[0] != normalize(get_last_letter(last_city)):
+        error = f"Нужен город на букву <b>{get_last_letter(last_city).upper()}</b>!"
+    elif idx is None:
+        error = unknown_city_text(city, get_last_letter(last_city), pool)
+    if error:
+        if await save_multiplayer_game(message, game_id, game, version):
+            await message.answer(error, parse_mode="HTML")
         return
     
     # Ход принят
-    game["used"].append(city)
-    game["scores"][str(user_id)] += 1
+    game.play(city, idx)
+    game.add_point(user_id)
     
     # Проверка на победу (если использованы все города)
-    if len(game["used"]) >= MAX_CITIES_IN_GAME:
-        player1_score = game["scores"][str(game["player1"])]
-        player2_score = game["scores"][str(game["player2"])]
-        winner_id = game["player1"] if player1_score > player2_score else game["player2"]
-        await end_multiplayer_game(game_id, winner_id, "достигнут лимит городов")
-        await state.set_state(GameState.MAIN_MENU)
+    if len(pool) >= MAX_CITIES_IN_GAME:
+        if await save_multiplayer_game(message, game_id, game, version):
+            winner_id = game.player1 if game.score1 > game.score2 else game.player2
+            await end_multiplayer_game(game_id, winner_id, "достигнут лимит городов")
+            await state.set_state(GameState.MAIN_MENU)
         return
     
     # Определяем следующего игрока
-    opponent_id = game["player2"] if user_id == game["player1"] else game["player1"]
-    game["current_turn"] = opponent_id
+    opponent_id = game.opponent(user_id)
+    game.current_turn = opponent_id
+    if not await save_multiplayer_game(message, game_id, game, version):
+        return
+    prefetch_city(game_id, city)
     
     # Уведомляем игроков
     await message.answer(
@@ -638,20 +906,65 @@ async def multiplayer_turn(message: Message, state: FSMContext):
         opponent_id,
         f"🏙 Соперник назвал: <b>{city}</b>\n"
         f"📌 Ваш ход на букву <b>{get_last_letter(city).upper()}</b>\n"
-        f"📊 Счет: Вы {game['scores'][str(opponent_id)]} - {game['scores'][str(user_id)]} Соперник",
+        f"📊 Счет: Вы {game.score(opponent_id)} - {game.score(user_id)} Соперник",
         reply_markup=game_kb(),
         parse_mode="HTML"
     )
 
 # --- Вспомогательные функции ---
+def session_key(user_id: Any) -> str:
+    return f"session:{user_id}"
+
+def game_key(game_id: str) -> str:
+    return f"game:{game_id}"
+
+def register_dictionary(dictionary: BaseCityDictionary):
+    """Запоминаем словарь, чтобы начатые на нем игры проверялись по нему же"""
+    dictionaries.pop(dictionary.fingerprint, None)
+    dictionaries[dictionary.fingerprint] = dictionary
+    while len(dictionaries) > DICTIONARY_HISTORY:
+        del dictionaries[next(iter(dictionaries))]
+
+def decode_game(record: Any) -> Optional[Game]:
+    """Игра из записи хранилища (у игрока в мультиплеере там ссылка на игру)"""
+    if not isinstance(record, list):
+        return None
+    return Game.from_record(record, dictionaries, CITIES)
+
+async def load_single_game(user_id: int) -> Tuple[Optional[SingleGame], int]:
+    record, version = await session_store.load(session_key(user_id))
+    game = decode_game(record)
+    return (game if isinstance(game, SingleGame) else None), version
+
+async def load_multiplayer_game(game_id: str) -> Tuple[Optional[MultiGame], int]:
+    record, version = await session_store.load(game_key(game_id))
+    game = decode_game(record)
+    return (game if isinstance(game, MultiGame) else None), version
+
+async def save_single_game(message: Message, user_id: int, game: SingleGame, version: int) -> bool:
+    """Сохраняем одиночную игру; при параллельном изменении просим повторить"""
+    if await session_store.save(session_key(user_id), game.to_record(), version):
+        deadlines.schedule((GameModes.SINGLE, user_id), game.time_left())
+        return True
+    await message.answer("⏳ Предыдущий ход еще обрабатывается, повторите")
+    return False
+
+async def save_multiplayer_game(message: Message, game_id: str, game: MultiGame, version: int) -> bool:
+    """Сохраняем мультиплеерную игру; при параллельном изменении просим повторить"""
+    if await session_store.save(game_key(game_id), game.to_record(), version):
+        deadlines.schedule((GameModes.MULTI, game_id), game.time_left())
+        return True
+    await message.answer("⏳ Предыдущий ход еще обрабатывается, повторите")
+    return False
+
 async def end_single_game(user_id: int, reason: str):
     """Завершение одиночной игры"""
-    session = user_sessions.get(user_id)
-    if not session:
+    game, _ = await load_single_game(user_id)
+    if not game:
         return
     
-    player_score = session["score"]["player"]
-    bot_score = session["score"]["bot"]
+    player_score = game.player_score
+    bot_score = game.bot_score
     
     if player_score > bot_score:
         result = "вы победили"
@@ -662,35 +975,45 @@ async def end_single_game(user_id: int, reason: str):
     else:
         result = "ничья"
     
-    await bot.send_message(
-        user_id,
-        f"🏁 Игра окончена! {reason}\n"
-        f"📊 Счет: {player_score}-{bot_score}\n"
-        f"🎉 Результат: {result}",
-        reply_markup=main_menu_kb()
-    )
-    del user_sessions[user_id]
+    with priority(PRIORITY_SUMMARY):
+        await bot.send_message(
+            user_id,
+            f"🏁 Игра окончена! {reason}\n"
+            f"📊 Счет: {player_score}-{bot_score}\n"
+            f"🎉 Результат: {result}",
+            reply_markup=main_menu_kb()
+        )
+    await discard_single_game(user_id)
+
+async def discard_single_game(user_id: int):
+    """Убираем одиночную игру вместе с ее таймером и прогревом"""
+    deadlines.cancel((GameModes.SINGLE, user_id))
+    prefetcher.cancel(user_id)
+    await session_store.delete(session_key(user_id))
 
 async def end_multiplayer_game(game_id: str, winner_id: int, reason: str):
     """Завершение мультиплеерной игры"""
-    game = active_games.get(game_id)
+    game, _ = await load_multiplayer_game(game_id)
     if not game:
         return
     
-    player1 = game["player1"]
-    player2 = game["player2"]
+    player1 = game.player1
+    player2 = game.player2
     
     result_text = (
         f"🏁 Игра завершена! {reason}\n\n"
         f"📊 Счет:\n"
-        f"Игрок 1: {game['scores'][str(player1)]}\n"
-        f"Игрок 2: {game['scores'][str(player2)]}\n\n"
+        f"Игрок 1: {game.score1}\n"
+        f"Игрок 2: {game.score2}\n\n"
         f"🏆 Победитель: {'Игрок 1' if winner_id == player1 else 'Игрок 2'}"
     )
     
-    # Отправляем результаты
-    await bot.send_message(player1, result_text, reply_markup=main_menu_kb())
-    await bot.send_message(player2, result_text, reply_markup=main_menu_kb())
+    # Отправляем результаты обоим игрокам параллельно
+    with priority(PRIORITY_SUMMARY):
+        await asyncio.gather(
+            bot.send_message(player1, result_text, reply_markup=main_menu_kb()),
+            bot.send_message(player2, result_text, reply_markup=main_menu_kb())
+        )
     
     # Обновляем статистику
     if winner_id in (player1, player2):
@@ -699,59 +1022,228 @@ async def end_multiplayer_game(game_id: str, winner_id: int, reason: str):
         update_stats(loser_id, False)
     
     # Очистка
-    if str(player1) in user_sessions:
-        del user_sessions[str(player1)]
-    if str(player2) in user_sessions:
-        del user_sessions[str(player2)]
-    if game_id in active_games:
-        del active_games[game_id]
+    registry.remove(game_id)
+    deadlines.cancel((GameModes.MULTI, game_id))
+    prefetcher.cancel(game_id)
+    await player_state(player1).set_state(GameState.MAIN_MENU)
+    await player_state(player2).set_state(GameState.MAIN_MENU)
+    await session_store.delete(session_key(player1))
+    await session_store.delete(session_key(player2))
+    await session_store.delete(game_key(game_id))
+
+async def cancel_invite(game_id: str):
+    """Приглашение не приняли вовремя"""
+    game, version = await load_multiplayer_game(game_id)
+    # Игрок мог с тех пор пригласить кого-то еще: тогда его состояние не трогаем
+    waiting = game is not None and registry.game_of(game.player1) == game_id
+    registry.remove(game_id)
+    if not game or game.started:
+        return
+    if not await session_store.delete(game_key(game_id), version):
+        return
+    if waiting:
+        await player_state(game.player1).set_state(GameState.MAIN_MENU)
+    with priority(PRIORITY_SUMMARY):
+        await bot.send_message(
+            game.player1,
+            f"⌛ Приглашение в игру #{game_id} истекло",
+            reply_markup=main_menu_kb()
+        )
+
+async def expire_invites():
+    """Периодически снимаем просроченные приглашения"""
+    while True:
+        await asyncio.sleep(60)
+        for game_id in registry.expired_invites():
+            try:
+                await actors.call((GameModes.MULTI, game_id), cancel_invite, game_id)
+            except Exception as e:
+                logger.error(f"Ошибка отмены приглашения {game_id}: {e}")
+
+def player_state(user_id: int) -> FSMContext:
+    """FSM другого игрока (личный чат с ботом)"""
+    return dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+
+async def bot_move(user_id: int, pool: CityPool, letter: str, difficulty: Dict[str, Any]) -> Optional[str]:
+    """Ход бота: на сложном уровне - перебором, по возможности в пуле процессов"""
+    if not difficulty["strategy"]:
+        return pool.pick(letter)
+    if search_pool and isinstance(pool.dictionary, MappedCityDictionary):
+        return await search_pool.choose(pool, letter, (GameModes.SINGLE, user_id))
+    return engine.choose(pool, letter)
+
+def cancel_search(key: Tuple[str, Any]):
+    """Отменяем поиск хода игры, которая заканчивается
+
+    Вызывается до постановки в очередь игры: внутри очереди поиск уже закончен.
+    """
+    if search_pool:
+        search_pool.cancel(key)
+
+def start_search_pool():
+    """Пул поиска ходов; создается до запуска потоков, так как процессы порождаются через fork"""
+    global search_pool
+    if MOVE_WORKERS > 0 and isinstance(CITIES, MappedCityDictionary):
+        search_pool = SearchPool(CITIES.path, get_last_letter, MOVE_WORKERS, SEARCH_BUDGET)
+        search_pool.warm()
 
 def update_stats(user_id: int, is_win: bool):
     """Обновление статистики игрока"""
-    stats = user_stats.get(user_id, {"wins": 0, "losses": 0})
-    if is_win:
-        stats["wins"] += 1
+    stats_store.record(user_id, is_win)
+
+async def on_timeout(key: Tuple[str, Any]):
+    """Время на ход вышло"""
+    cancel_search(key)
+    await actors.call(key, expire_game, key)
+
+async def expire_game(key: Tuple[str, Any]):
+    """Завершение игры по таймауту (в очереди игры)"""
+    mode, target = key
+    if mode == GameModes.SINGLE:
+        game, version = await load_single_game(target)
     else:
-        stats["losses"] += 1
-    user_stats[user_id] = stats
+        game, version = await load_multiplayer_game(target)
+    if not game or game.deadline is None:
+        return
+    
+    # Ход мог быть сделан через другой воркер: тогда дедлайн уже перенесен
+    left = game.time_left()
+    if left > 0:
+        deadlines.schedule(key, left)
+        return
+    
+    # Таймер игры стоит в каждом воркере: завершает тот, кто первым снял дедлайн
+    game.deadline = None
+    store_key = session_key(target) if mode == GameModes.SINGLE else game_key(target)
+    if not await session_store.save(store_key, game.to_record(), version):
+        return
+    
+    if mode == GameModes.SINGLE:
+        await end_single_game(target, "время вышло")
+        return
+    
+    await end_multiplayer_game(target, game.opponent(game.current_turn), "время вышло")
+
+deadlines = DeadlineScheduler(on_timeout)
 
-async def check_timeouts():
-    """Проверка таймаутов в играх"""
+async def watch_cities():
+    """Перезагружаем словарь при изменении cities.txt или city_scores.txt"""
+    last_mtime = sources_mtime()
     while True:
-        await asyncio.sleep(10)
-        now = datetime.now()
-        
-        # Проверяем одиночные игры
-        for user_id, session in list(user_sessions.items()):
-            if session.get("mode") != GameModes.SINGLE:
-                continue
-                
-            time_passed = (now - session["last_move"]).seconds
-            time_limit = DIFFICULTIES[session["difficulty"]]["time"]
-            
-            if time_passed > time_limit:
-                await end_single_game(user_id, "время вышло")
-        
-        # Проверяем мультиплеер
-        for game_id, game in list(active_games.items()):
-            if not game.get("started"):
-                continue
-                
-            time_passed = (now - game["last_move"]).seconds
-            if time_passed > 120:  # 2 минуты на ход
-                inactive_player = game["current_turn"]
-                active_player = game["player2"] if inactive_player == game["player1"] else game["player1"]
-                await end_multiplayer_game(game_id, active_player, "время вышло")
+        await asyncio.sleep(CITIES_WATCH_INTERVAL)
+        if not os.path.exists(CITIES_FILE):
+            continue
+        mtime = sources_mtime()
+        if mtime == last_mtime:
+            continue
+        last_mtime = mtime
+        try:
+            await reload_cities()
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки словаря: {e}")
 
 # --- Запуск ---
 async def on_startup():
     """Действия при запуске"""
-    asyncio.create_task(check_timeouts())
+    global bot_user
+    bot_user = await bot.get_me()
+    asyncio.create_task(deadlines.run())
+    asyncio.create_task(outbound.run())
+    asyncio.create_task(stats_store.run())
+    if isinstance(session_store, SnapshotSessionStore):
+        asyncio.create_task(session_store.run())
+    asyncio.create_task(watch_cities())
+    asyncio.create_task(expire_invites())
+    asyncio.create_task(asyncio.to_thread(fuzzy.build_index, CITIES))
+    asyncio.create_task(asyncio.to_thread(engine.graph, CITIES))
+    asyncio.create_task(asyncio.to_thread(CITIES.name_model))
+    get_http_session()
     logger.info("Бот запущен")
 
+async def on_shutdown():
+    """Действия при остановке"""
+    if http_session and not http_session.closed:
+        await http_session.close()
+    wiki_cache.close()
+    await stats_store.close()
+    await session_store.close()
+    if search_pool:
+        search_pool.close()
+
+# Записи игр: одиночные по игроку и мультиплеерные по ID
+GAME_PREFIXES = ("session:", "game:")
+
+def index_games(items: Iterable[Tuple[str, Any]]) -> Tuple[List[Tuple[Tuple[str, Any], float]], List[Tuple[str, int, Any, bool]]]:
+    """Дедлайны (ключ таймера, срок по часам) и мультиплеерные игры из записей
+
+    Из записи берутся только дедлайн и игроки, учет городов не восстанавливается.
+    """
+    timers, multi = [], []
+    for key, record in items:
+        index = record_index(record)
+        if index is None:
+            continue  # У игрока мультиплеера - ссылка на игру
+        _, _, target = key.partition(":")
+        kind, deadline, players = index
+        if players is None:
+            timer_key = (GameModes.SINGLE, int(target))
+        else:
+            timer_key = (GameModes.MULTI, target)
+            multi.append((target, *players))
+        if deadline is not None:
+            timers.append((timer_key, deadline))
+    return timers, multi
+
+def scan_snapshot() -> Tuple[List[Tuple[Tuple[str, Any], float]], List[Tuple[str, int, Any, bool]]]:
+    """Поднимаем хранилище из снимка и журнала и разбираем записи игр (в потоке)"""
+    session_store.restore()
+    return index_games(session_store.items(GAME_PREFIXES))
+
+async def restore_games():
+    """Заново ставим таймеры игр и индексируем приглашения после перезапуска
+
+    Хранилище со снимками поднимается в потоке вместе с разбором записей:
+    игр бывают сотни тысяч, в цикле событий остается только постановка
+    таймеров. В Redis игры уже лежат, и их таймеры ставит каждый воркер.
+    """
+    if isinstance(session_store, SnapshotSessionStore):
+        timers, multi = await asyncio.to_thread(scan_snapshot)
+    else:
+        records = []
+        for key in await session_store.keys():
+            if key.startswith(GAME_PREFIXES):
+                record, _ = await session_store.load(key)
+                records.append((key, record))
+        timers, multi = index_games(records)
+    for game_id, player1, player2, started in multi:
+        if started:
+            registry.add_started(game_id, player1, player2)
+        else:
+            # Время приглашения не сохраняется: отсчитываем заново
+            registry.add_pending(game_id, player1, player2)
+    now = time.time()
+    deadlines.schedule_many((key, deadline - now) for key, deadline in timers)
+
+async def run_webhook():
+    """Работа через вебхук"""
+    server = WebhookServer(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_IN_FLIGHT)
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=min(WEBHOOK_MAX_IN_FLIGHT, 100)
+        )
+    await server.run(WEBHOOK_HOST, WEBHOOK_PORT)
+
 async def main():
+    start_search_pool()
+    await restore_games()
     dp.startup.register(on_startup)
-    await dp.start_polling(bot)
+    dp.shutdown.register(on_shutdown)
+    if WEBHOOK_ENABLED:
+        await run_webhook()
+    else:
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     try:
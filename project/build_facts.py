@@ -0,0 +1,29 @@
+"""Сборка локального пакета описаний городов для "Что за город?"
+
+Использование: python build_facts.py [facts.tsv] [facts.bin]
+Входной файл: по строке на город, "Название<TAB>Краткое описание".
+"""
+import sys
+import time
+
+from facts import FactsBundle, write_bundle
+
+
+def read_entries(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            city, _, summary = line.rstrip("\r\n").partition("\t")
+            if city.strip() and summary.strip():
+                yield city.strip(), summary.strip()
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "facts.tsv"
+    target = sys.argv[2] if len(sys.argv) > 2 else "facts.bin"
+    started = time.perf_counter()
+    write_bundle(read_entries(source), target)
+    print(f"{target}: {len(FactsBundle(target))} описаний за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Офлайн-компиляция cities.txt в бинарный словарь для mmap
+
+Использование: python compile_cities.py [cities.txt] [cities.bin] [city_scores.txt]
+"""
+import sys
+import time
+
+from dictionary import CityDictionary, DEFAULT_CITIES, read_city_names, read_city_scores, write_compiled
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "cities.txt"
+    target = sys.argv[2] if len(sys.argv) > 2 else "cities.bin"
+    scores = sys.argv[3] if len(sys.argv) > 3 else "city_scores.txt"
+    started = time.perf_counter()
+    dictionary = CityDictionary(read_city_names(source) + DEFAULT_CITIES, read_city_scores(scores))
+    write_compiled(dictionary, target)
+    print(f"{target}: {len(dictionary)} городов за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
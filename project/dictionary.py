@@ -0,0 +1,433 @@
+import mmap
+import os
+import random
+import re
+import struct
+import tempfile
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, List, Optional, Set, Iterable, Iterator, Sequence, Tuple, Union
+
+from markov import NameModel
+
+# Сколько случайных попыток делаем перед полным просмотром буквы
+PICK_ATTEMPTS = 8
+# Сколько раз пробуем сочинить фейковый город, не совпавший с настоящим
+FAKE_ATTEMPTS = 8
+FAKE_MIN_LENGTH = 4
+
+# Дефисы, тире и пробелы считаем одним разделителем
+_SEPARATORS = re.compile(r"[\s\-\u2010\u2011\u2012\u2013\u2014]+")
+_NONZERO = re.compile(rb"[^\x00]")
+
+DEFAULT_CITIES = [
+    "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань",
+    "Нижний Новгород", "Челябинск", "Самара", "Омск", "Ростов-на-Дону",
+    "Уфа", "Красноярск", "Пермь", "Воронеж", "Волгоград"
+]
+
+# Формат скомпилированного словаря (порядок байт - родной для машины):
+# заголовок, смещения и данные имен (отсортированы), смещения и данные
+# нормализованных ключей, хеш-таблица ключей (id + 1, 0 - пусто),
+# таблица букв (код, начало, количество), id городов, сгруппированные по буквам,
+# марковская модель названий для фейковых городов и те же группы id,
+# упорядоченные по популярности (начала и длины групп берутся из таблицы букв)
+MAGIC = b"CITY"
+VERSION = 3
+_HEADER = struct.Struct("=4sIIII10Q")
+
+
+def normalize(name: str) -> str:
+    """Ключ для поиска: регистр, ё/е и разделители не важны"""
+    return _SEPARATORS.sub("-", name.strip().casefold().replace("ё", "е"))
+
+
+def _hash(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8"))
+
+
+def read_city_names(path: str) -> List[str]:
+    """Читаем названия городов из текстового файла"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def read_city_scores(path: str) -> Dict[str, float]:
+    """Популярность городов: строки "Город<TAB>оценка", файла может не быть"""
+    scores: Dict[str, float] = {}
+    if not os.path.exists(path):
+        return scores
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            name, _, score = line.strip().rpartition("\t")
+            if name:
+                scores[normalize(name)] = float(score)
+    return scores
+
+
+class BaseCityDictionary(ABC):
+    """Общие операции словаря поверх id городов"""
+
+    # Отпечаток содержимого: одинаков у одинаковых словарей в разных процессах
+    fingerprint: int
+    _letter_masks: Dict[str, int]
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Число городов; id идут от 0 до len - 1"""
+
+    @abstractmethod
+    def name(self, idx: int) -> str:
+        """Каноническое написание города"""
+
+    @abstractmethod
+    def key_index(self, key: str) -> Optional[int]:
+        """id по уже нормализованному ключу"""
+
+    def key(self, idx: int) -> str:
+        """Нормализованный ключ города"""
+        return normalize(self.name(idx))
+
+    @abstractmethod
+    def letter_ids(self, letter: str) -> Sequence[int]:
+        """id городов на букву (буква уже нормализована)"""
+
+    @abstractmethod
+    def ranked_ids(self, letter: str) -> Sequence[int]:
+        """id городов на букву от самых популярных (буква уже нормализована)"""
+
+    def __contains__(self, name: str) -> bool:
+        return self.key_index(normalize(name)) is not None
+
+    def lookup(self, name: str) -> Optional[int]:
+        """id города по любому написанию"""
+        return self.key_index(normalize(name))
+
+    def resolve(self, name: str) -> Optional[Tuple[int, str]]:
+        """id и каноническое написание города одним поиском или None"""
+        idx = self.key_index(normalize(name))
+        return None if idx is None else (idx, self.name(idx))
+
+    def letter_mask(self, letter: str) -> int:
+        """Битовая маска id городов на букву (буква уже нормализована)"""
+        mask = self._letter_masks.get(letter)
+        if mask is None:
+            bits = bytearray((len(self) + 7) // 8)
+            for idx in self.letter_ids(letter):
+                bits[idx >> 3] |= 1 << (idx & 7)
+            mask = self._letter_masks[letter] = int.from_bytes(bits, "little")
+        return mask
+
+    def random_city(self) -> str:
+        """Случайный город из словаря"""
+        return self.name(random.randrange(len(self)))
+
+    @abstractmethod
+    def name_model(self) -> NameModel:
+        """Марковская модель названий городов словаря"""
+
+    def fake_city(self, letter: str) -> Optional[str]:
+        """Правдоподобный несуществующий город на букву или None, если не вышло"""
+        model = self.name_model()
+        for _ in range(FAKE_ATTEMPTS):
+            name = model.generate(letter)
+            if len(name) >= FAKE_MIN_LENGTH and name not in self:
+                return name
+        return None
+
+
+class CityDictionary(BaseCityDictionary):
+    """Словарь городов в памяти"""
+
+    def __init__(self, names: Iterable[str], scores: Optional[Dict[str, float]] = None):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}  # Нормализованный ключ -> id
+        self.by_letter: Dict[str, List[int]] = {}
+        self._letter_masks = {}
+        for name in sorted(set(names)):
+            key = normalize(name)
+            if not key or key in self.index:
+                continue
+            idx = len(self.names)
+            self.names.append(name)
+            self.index[key] = idx
+            self.by_letter.setdefault(key[0], []).append(idx)
+        # Без оценки город считается наименее популярным; при равенстве - по алфавиту
+        scores = scores or {}
+        self.ranked: Dict[str, List[int]] = {
+            letter: sorted(ids, key=lambda idx: -scores.get(normalize(self.names[idx]), 0.0))
+            for letter, ids in self.by_letter.items()
+        }
+        self.fingerprint = (len(self.names) << 32) | zlib.crc32("".join(self.index).encode("utf-8"))
+        self._name_model: Optional[NameModel] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def name(self, idx: int) -> str:
+        return self.names[idx]
+
+    def key_index(self, key: str) -> Optional[int]:
+        return self.index.get(key)
+
+    def letter_ids(self, letter: str) -> Sequence[int]:
+        return self.by_letter.get(letter, ())
+
+    def ranked_ids(self, letter: str) -> Sequence[int]:
+        return self.ranked.get(letter, ())
+
+    def name_model(self) -> NameModel:
+        if self._name_model is None:
+            self._name_model = NameModel.train(self.names)
+        return self._name_model
+
+
+def write_compiled(dictionary: CityDictionary, path: str):
+    """Сохраняем словарь в бинарный формат для mmap"""
+    count = len(dictionary)
+    keys = [normalize(name) for name in dictionary.names]
+
+    def string_table(strings: List[str]) -> Tuple[array, bytes]:
+        offsets = array("I", [0])
+        data = bytearray()
+        for s in strings:
+            data += s.encode("utf-8")
+            offsets.append(len(data))
+        return offsets, bytes(data)
+
+    name_offsets, name_data = string_table(dictionary.names)
+    key_offsets, key_data = string_table(keys)
+
+    # Открытая адресация с линейным пробированием, заполнение не выше 50%
+    hash_size = 1
+    while hash_size < count * 2:
+        hash_size *= 2
+    slots = array("I", [0]) * hash_size
+    for idx, key in enumerate(keys):
+        pos = _hash(key) & (hash_size - 1)
+        while slots[pos]:
+            pos = (pos + 1) & (hash_size - 1)
+        slots[pos] = idx + 1
+
+    letter_table = array("I")
+    letter_ids = array("I")
+    ranked_ids = array("I")
+    for letter in sorted(dictionary.by_letter):
+        ids = dictionary.by_letter[letter]
+        letter_table.extend((ord(letter), len(letter_ids), len(ids)))
+        letter_ids.extend(ids)
+        ranked_ids.extend(dictionary.ranked[letter])
+
+    model = dictionary.name_model().to_bytes()
+    sections = [name_offsets, name_data, key_offsets, key_data, slots, letter_table, letter_ids, model, ranked_ids]
+    blobs = [s.tobytes() if isinstance(s, array) else s for s in sections]
+    offsets = []
+    pos = _HEADER.size + (-_HEADER.size % 8)
+    for blob in blobs:
+        offsets.append(pos)
+        pos += len(blob) + (-len(blob) % 8)
+
+    # Свой временный файл у каждого писателя: воркеры пересобирают словарь одновременно
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, count, hash_size, len(letter_table) // 3, *offsets, len(model)))
+            for offset, blob in zip(offsets, blobs):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(blob)
+        # mkstemp создает файл с правами 0600, а словарь читают и другие процессы
+        os.chmod(tmp_path, 0o644)
+        # Атомарная замена: процессы со старым mmap продолжают читать старый файл
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class MappedCityDictionary(BaseCityDictionary):
+    """Скомпилированный словарь, отображенный в память через mmap"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, hash_size, letters, *offsets, model_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Неподдерживаемый формат словаря: {path}")
+
+        view = memoryview(self._mm)
+
+        def ints(offset: int, length: int) -> memoryview:
+            return view[offset:offset + length * 4].cast("I")
+
+        self.path = path
+        self._count = count
+        self._letter_masks = {}
+        self._hash_mask = hash_size - 1
+        self._name_offsets = ints(offsets[0], count + 1)
+        self._name_data = offsets[1]
+        self._key_offsets = ints(offsets[2], count + 1)
+        self._key_data = offsets[3]
+        self._slots = ints(offsets[4], hash_size)
+        letter_table = ints(offsets[5], letters * 3)
+        all_ids = ints(offsets[6], count)
+        all_ranked = ints(offsets[8], count)
+        self._by_letter: Dict[str, memoryview] = {}
+        self._ranked: Dict[str, memoryview] = {}
+        for i in range(letters):
+            code, start, length = letter_table[i * 3:i * 3 + 3]
+            self._by_letter[chr(code)] = all_ids[start:start + length]
+            self._ranked[chr(code)] = all_ranked[start:start + length]
+        key_data = view[self._key_data:self._key_data + self._key_offsets[count]]
+        self.fingerprint = (count << 32) | zlib.crc32(key_data)
+        self._model_data = view[offsets[7]:offsets[7] + model_size]
+        self._name_model: Optional[NameModel] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _string(self, base: int, offsets: memoryview, idx: int) -> str:
+        return self._mm[base + offsets[idx]:base + offsets[idx + 1]].decode("utf-8")
+
+    def name(self, idx: int) -> str:
+        return self._string(self._name_data, self._name_offsets, idx)
+
+    def key(self, idx: int) -> str:
+        return self._string(self._key_data, self._key_offsets, idx)
+
+    def key_index(self, key: str) -> Optional[int]:
+        pos = _hash(key) & self._hash_mask
+        while True:
+            slot = self._slots[pos]
+            if not slot:
+                return None
+            if self._string(self._key_data, self._key_offsets, slot - 1) == key:
+                return slot - 1
+            pos = (pos + 1) & self._hash_mask
+
+    def letter_ids(self, letter: str) -> Sequence[int]:
+        return self._by_letter.get(letter, ())
+
+    def ranked_ids(self, letter: str) -> Sequence[int]:
+        return self._ranked.get(letter, ())
+
+    def name_model(self) -> NameModel:
+        # Модель обучена при компиляции, здесь только распаковка
+        if self._name_model is None:
+            self._name_model = NameModel.from_bytes(self._model_data)
+        return self._name_model
+
+
+class CityPool:
+    """Названные в игре города: битовое множество по id словаря"""
+
+    __slots__ = ("dictionary", "used", "extra")
+
+    def __init__(self, dictionary: BaseCityDictionary):
+        self.dictionary = dictionary
+        self.used = 0  # Бит idx установлен - город idx уже назван
+        self.extra: Optional[Set[str]] = None  # Названные города вне словаря (фейки)
+
+    def __len__(self) -> int:
+        return self.used.bit_count() + (len(self.extra) if self.extra else 0)
+
+    def __contains__(self, idx: int) -> bool:
+        return self.used >> idx & 1 == 1
+
+    def used_ids(self) -> Iterator[int]:
+        """id названных городов; нулевые байты множества пропускаются без цикла в Python"""
+        data = self.used.to_bytes((self.used.bit_length() + 7) // 8, "little")
+        for match in _NONZERO.finditer(data):
+            base, byte = match.start() * 8, data[match.start()]
+            while byte:
+                low = byte & -byte
+                yield base + low.bit_length() - 1
+                byte ^= low
+
+    def dump(self) -> Tuple[List[int], List[str]]:
+        """Состояние для сохранения вне процесса
+
+        Множество в памяти - битовое, а сохраняются разности соседних id:
+        партия называет сотни городов, а битов в словаре могут быть сотни тысяч.
+        """
+        deltas, prev = [], 0
+        for idx in self.used_ids():
+            deltas.append(idx - prev)
+            prev = idx
+        return deltas, sorted(self.extra or ())
+
+    @classmethod
+    def restore(cls, dictionary: BaseCityDictionary, used: Union[List[int], str], extra: List[str]) -> "CityPool":
+        """Восстанавливаем учет по сохраненному состоянию того же словаря"""
+        pool = cls(dictionary)
+        if isinstance(used, str):
+            # Записи старого формата: шестнадцатеричная строка битового множества
+            pool.used = int(used, 16)
+        else:
+            idx = 0
+            for delta in used:
+                idx += delta
+                pool.used |= 1 << idx
+        pool.extra = set(extra) or None
+        return pool
+
+    def remaining(self, letter: str) -> int:
+        """Сколько городов на букву еще не названо"""
+        letter = normalize(letter)
+        taken = (self.used & self.dictionary.letter_mask(letter)).bit_count()
+        return len(self.dictionary.letter_ids(letter)) - taken
+
+    def is_used(self, city: str) -> bool:
+        return self.is_named(self.dictionary.lookup(city), city)
+
+    def is_named(self, idx: Optional[int], city: str) -> bool:
+        """Назван ли город, уже найденный в словаре (idx None - города в словаре нет)"""
+        if idx is None:
+            return bool(self.extra) and normalize(city) in self.extra
+        return idx in self
+
+    def take(self, city: str, idx: Optional[int] = None) -> Optional[int]:
+        """Отмечаем город как названный; возвращаем его id (None для фейков)
+
+        idx - id города, если он уже найден в словаре: второй раз не ищем.
+        """
+        if idx is None:
+            key = normalize(city)
+            idx = self.dictionary.key_index(key)
+        if idx is None:
+            if self.extra is None:
+                self.extra = set()
+            self.extra.add(key)
+        else:
+            self.used |= 1 << idx
+        return idx
+
+    def pick(self, letter: str) -> Optional[str]:
+        """Случайный еще не названный город на букву"""
+        letter = normalize(letter)
+        if self.remaining(letter) <= 0:
+            return None
+        ids = self.dictionary.letter_ids(letter)
+        for _ in range(PICK_ATTEMPTS):
+            idx = ids[random.randrange(len(ids))]
+            if idx not in self:
+                return self.dictionary.name(idx)
+        free = [idx for idx in ids if idx not in self]
+        return self.dictionary.name(random.choice(free))
+
+    def hint_ids(self, letter: str, limit: int) -> List[int]:
+        """id limit самых популярных еще не названных городов на букву
+
+        Названные города пропускаются по ходу просмотра готового рейтинга,
+        список всех свободных городов не строится.
+        """
+        result = []
+        for idx in self.dictionary.ranked_ids(normalize(letter)):
+            if idx in self:
+                continue
+            result.append(idx)
+            if len(result) >= limit:
+                break
+        return result
@@ -0,0 +1,159 @@
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from dictionary import normalize
+
+try:
+    import zstandard
+except ImportError:  # zstandard не обязателен, тогда блоки сжимаются zlib
+    zstandard = None
+
+# Формат пакета описаний: заголовок, смещения и данные ключей (отсортированы),
+# по записи на ключ (блок, смещение, длина), таблица блоков (смещение, размер)
+# и сами сжатые блоки
+MAGIC = b"FCTS"
+VERSION = 1
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+BLOCK_SIZE = 64 * 1024  # Размер блока до сжатия
+CACHED_BLOCKS = 16  # Сколько распакованных блоков держим в памяти
+_HEADER = struct.Struct("=4sIIII4Q")
+
+
+def write_bundle(entries: Iterable[Tuple[str, str]], path: str):
+    """Упаковываем описания городов в блоки с индексом по ключу"""
+    summaries = {}
+    for city, summary in entries:
+        key = normalize(city)
+        if key and summary:
+            summaries.setdefault(key, summary)
+    keys = sorted(summaries)
+
+    if zstandard is not None:
+        codec, compress = CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress
+    else:
+        codec, compress = CODEC_ZLIB, lambda data: zlib.compress(data, 9)
+
+    key_offsets = array("I", [0])
+    key_data = bytearray()
+    records = array("I")
+    blocks: List[bytes] = []
+    block = bytearray()
+    for key in keys:
+        key_data += key.encode("utf-8")
+        key_offsets.append(len(key_data))
+        text = summaries[key].encode("utf-8")
+        if block and len(block) + len(text) > BLOCK_SIZE:
+            blocks.append(compress(bytes(block)))
+            block = bytearray()
+        records.extend((len(blocks), len(block), len(text)))
+        block += text
+    if block:
+        blocks.append(compress(bytes(block)))
+
+    block_table = array("Q")
+    sections = [key_offsets.tobytes(), bytes(key_data), records.tobytes()]
+    offsets = []
+    pos = _HEADER.size
+    for blob in sections:
+        pos += -pos % 8
+        offsets.append(pos)
+        pos += len(blob)
+    pos += -pos % 8
+    table_offset = pos
+    pos += len(blocks) * 16
+    for data in blocks:
+        block_table.extend((pos, len(data)))
+        pos += len(data)
+
+    # Свой временный файл у каждой сборки: две сборки не пишут в один файл
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, codec, len(keys), len(blocks), *offsets, table_offset))
+            for offset, blob in zip(offsets, sections):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(blob)
+            f.write(b"\0" * (table_offset - f.tell()))
+            f.write(block_table.tobytes())
+            for data in blocks:
+                f.write(data)
+        # mkstemp создает файл с правами 0600, а пакет читает бот
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class FactsBundle:
+    """Локальный пакет описаний городов, отображенный в память"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, codec, count, block_count, *offsets = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Неподдерживаемый формат пакета описаний: {path}")
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError(f"Для {path} нужен пакет zstandard")
+            self._decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            self._decompress = zlib.decompress
+
+        view = memoryview(self._mm)
+        self._count = count
+        self._key_offsets = view[offsets[0]:offsets[0] + (count + 1) * 4].cast("I")
+        self._key_data = offsets[1]
+        self._records = view[offsets[2]:offsets[2] + count * 12].cast("I")
+        self._blocks = view[offsets[3]:offsets[3] + block_count * 16].cast("Q")
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, city: str) -> bool:
+        return self._find(normalize(city)) is not None
+
+    def _key(self, idx: int) -> bytes:
+        start = self._key_data + self._key_offsets[idx]
+        end = self._key_data + self._key_offsets[idx + 1]
+        return self._mm[start:end]
+
+    def _find(self, key: str) -> Optional[int]:
+        # Ключи отсортированы по строкам, а порядок UTF-8 совпадает с порядком кодовых точек
+        target = key.encode("utf-8")
+        idx = bisect.bisect_left(range(self._count), target, key=self._key)
+        if idx < self._count and self._key(idx) == target:
+            return idx
+        return None
+
+    def _block(self, number: int) -> bytes:
+        data = self._cache.get(number)
+        if data is None:
+            offset, size = self._blocks[number * 2], self._blocks[number * 2 + 1]
+            data = self._decompress(self._mm[offset:offset + size])
+            self._cache[number] = data
+            if len(self._cache) > CACHED_BLOCKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(number)
+        return data
+
+    def get(self, city: str) -> Optional[str]:
+        """Описание города или None, если его нет в пакете"""
+        idx = self._find(normalize(city))
+        if idx is None:
+            return None
+        number, start, length = self._records[idx * 3:idx * 3 + 3]
+        return self._block(number)[start:start + length].decode("utf-8")
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from outbound import TokenBucket
+
+
+class _User:
+    __slots__ = ("bucket", "busy", "waiter", "warned")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.busy = False  # Сейчас обрабатывается сообщение пользователя
+        self.waiter: Optional[asyncio.Future] = None  # Единственное ждущее сообщение
+        self.warned = False
+
+
+class FloodControl(BaseMiddleware):
+    """Защита от флуда входящими сообщениями
+
+    У каждого пользователя свое ведро токенов: сообщения сверх лимита
+    отбрасываются (о чем пользователь узнает один раз). Сообщения одного
+    пользователя обрабатываются по одному; если за время медленного хода
+    пришло несколько новых, обработано будет только последнее.
+    interrupt(message) вызывается для сообщения, которому придется ждать:
+    так оно может прервать медленный ход, не дожидаясь его конца.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: float = 5.0,
+        max_idle_users: int = 10000,
+        interrupt: Optional[Callable[[Message], None]] = None
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_idle_users = max_idle_users
+        self.interrupt = interrupt
+        self._users: Dict[int, _User] = {}
+        # dropped - отброшено по лимиту, merged - вытеснено более новым сообщением
+        self.stats = {"dropped": 0, "merged": 0}
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.from_user is None:
+            return await handler(event, data)
+
+        now = asyncio.get_running_loop().time()
+        user = self._user(event.from_user.id, now)
+        if user.bucket.delay(now) > 0:
+            self.stats["dropped"] += 1
+            if not user.warned:
+                user.warned = True
+                await event.answer("⏳ Слишком много сообщений, подождите немного")
+            return None
+        user.bucket.take()
+        user.warned = False
+
+        if user.busy:
+            if self.interrupt is not None:
+                self.interrupt(event)
+            # Ждать может только одно сообщение: более старое уже неактуально
+            if user.waiter is not None:
+                user.waiter.set_result(False)
+                self.stats["merged"] += 1
+            user.waiter = asyncio.get_running_loop().create_future()
+            waiter = user.waiter
+            try:
+                if not await waiter:
+                    return None
+            except asyncio.CancelledError:
+                if user.waiter is waiter:
+                    user.waiter = None
+                elif waiter.done() and not waiter.cancelled() and waiter.result():
+                    self._release(user)  # Очередь уже передали нам: отдаем следующему
+                raise
+            # Пока ждали, предыдущее сообщение могло сменить состояние FSM
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+        user.busy = True
+
+        try:
+            return await handler(event, data)
+        finally:
+            self._release(user)
+
+    @staticmethod
+    def _release(user: _User):
+        waiter, user.waiter = user.waiter, None
+        if waiter is not None:
+            waiter.set_result(True)  # Передаем очередь, busy остается
+        else:
+            user.busy = False
+
+    def _user(self, user_id: int, now: float) -> _User:
+        user = self._users.get(user_id)
+        if user is None:
+            if len(self._users) >= self.max_idle_users:
+                self._prune(now)
+            user = self._users[user_id] = _User(TokenBucket(self.rate, self.burst, now))
+        return user
+
+    def _prune(self, now: float):
+        for user_id, user in list(self._users.items()):
+            if not user.busy and user.bucket.delay(now) == 0 and user.bucket.tokens >= user.bucket.capacity:
+                del self._users[user_id]
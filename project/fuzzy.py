@@ -0,0 +1,129 @@
+import weakref
+from array import array
+from collections import Counter
+from itertools import chain
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+from dictionary import BaseCityDictionary, normalize
+
+# Допустимое число опечаток в зависимости от длины названия
+SHORT_NAME = 4
+# Пределы работы одного поиска: записей индекса и проверок расстояния
+MAX_POSTINGS = 2000
+MAX_CANDIDATES = 40
+
+_indexes: "weakref.WeakKeyDictionary[BaseCityDictionary, FuzzyIndex]" = weakref.WeakKeyDictionary()
+
+
+def _trigrams(key: str) -> List[str]:
+    # Триграмма "  X" совпадает у всех городов на букву, ее не храним
+    padded = f" {key} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def _pattern(key: str) -> Dict[str, int]:
+    """Битовые маски позиций символов для алгоритма Майерса"""
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(key):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def _distance(pattern: Dict[str, int], length: int, text: str) -> int:
+    """Расстояние Левенштейна бит-параллельным алгоритмом Майерса"""
+    if not length:
+        return len(text)
+    mask = (1 << length) - 1
+    last = 1 << (length - 1)
+    pv, mv, score = mask, 0, length
+    for char in text:
+        eq = pattern.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+class FuzzyIndex:
+    """Триграммный индекс для поиска городов с опечатками"""
+
+    def __init__(self, dictionary: BaseCityDictionary):
+        self.dictionary = dictionary
+        # Ключ - первая буква + триграмма, чтобы сразу ограничиться буквой
+        postings: Dict[str, array] = {}
+        for idx in range(len(dictionary)):
+            key = dictionary.key(idx)
+            for trigram in _trigrams(key):
+                postings.setdefault(key[0] + trigram, array("I")).append(idx)
+        self.postings = postings
+
+    def suggest(self, text: str, letter: str, exclude: Container[int] = (), limit: int = 3) -> List[str]:
+        """Похожие города на нужную букву, кроме уже названных"""
+        key = normalize(text)
+        letter = normalize(letter)
+        if not key or not letter:
+            return []
+        max_distance = 1 if len(key) <= SHORT_NAME else 2
+
+        # Сначала редкие триграммы: частые ("ова", "ск ") есть у тысяч городов
+        # и почти ничего не говорят. Просматриваем не больше MAX_POSTINGS
+        # записей и проверяем расстоянием не больше MAX_CANDIDATES городов,
+        # так что время не растет вместе со словарем.
+        lists = sorted(
+            (self.postings.get(letter + trigram, ()) for trigram in _trigrams(key)),
+            key=len
+        )
+        taken: List[Sequence[int]] = []
+        scanned = 0
+        for ids in lists:
+            if scanned + len(ids) > MAX_POSTINGS:
+                if not taken:
+                    taken.append(ids[:MAX_POSTINGS])
+                break
+            taken.append(ids)
+            scanned += len(ids)
+        shared = Counter(chain.from_iterable(taken))
+
+        # Каждая правка портит не больше трех триграмм; непросмотренные
+        # списки могли содержать все остальные общие триграммы
+        threshold = max(1, len(taken) - 3 * max_distance)
+        pattern = _pattern(key)
+        scored: List[Tuple[int, int, int]] = []
+        checked = 0
+        for idx, count in shared.most_common():
+            if count < threshold:
+                break
+            if idx in exclude:
+                continue
+            candidate = self.dictionary.key(idx)
+            if abs(len(candidate) - len(key)) > max_distance:
+                continue
+            distance = _distance(pattern, len(key), candidate)
+            if distance <= max_distance:
+                scored.append((distance, -count, idx))
+            checked += 1
+            if checked >= MAX_CANDIDATES:
+                break
+        scored.sort()
+        return [self.dictionary.name(idx) for _, _, idx in scored[:limit]]
+
+
+def build_index(dictionary: BaseCityDictionary) -> FuzzyIndex:
+    """Строим индекс (долго, вызывать вне цикла событий)"""
+    index = FuzzyIndex(dictionary)
+    _indexes[dictionary] = index
+    return index
+
+
+def get_index(dictionary: BaseCityDictionary) -> Optional[FuzzyIndex]:
+    """Готовый индекс словаря или None, если он еще строится"""
+    return _indexes.get(dictionary)
@@ -0,0 +1,144 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Any, List, Mapping, Optional, Tuple, Union
+
+from dictionary import BaseCityDictionary, CityPool
+
+SINGLE = "s"
+MULTI = "m"
+
+PlayerId = Union[int, str]  # Приглашенный игрок может быть указан по @username
+
+
+class Game(ABC):
+    """Общее состояние игры: названные города, последний город и дедлайн хода
+
+    Записи в хранилище - короткие списки без имен полей. Дедлайн в памяти
+    хранится по time.monotonic(), а в записи - по часам, чтобы пережить
+    перезапуск.
+    """
+
+    __slots__ = ("pool", "last", "deadline")
+    kind = ""
+
+    def __init__(self, pool: CityPool):
+        self.pool = pool
+        self.last: Optional[str] = None
+        self.deadline: Optional[float] = None
+
+    def play(self, city: str, idx: Optional[int] = None):
+        """Город назван: отмечаем его и делаем последним (idx - его id, если известен)"""
+        self.pool.take(city, idx)
+        self.last = city
+
+    def set_timer(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+
+    def time_left(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def to_record(self) -> List[Any]:
+        used, extra = self.pool.dump()
+        deadline = None if self.deadline is None else time.time() + self.time_left()
+        return [self.kind, self.pool.dictionary.fingerprint, used, extra, self.last, deadline, *self._fields()]
+
+    @abstractmethod
+    def _fields(self) -> List[Any]:
+        """Поля конкретного вида игры в конце записи"""
+
+    @abstractmethod
+    def _load_fields(self, fields: List[Any]):
+        """Восстанавливаем поля, записанные _fields()"""
+
+    @staticmethod
+    def from_record(
+        record: List[Any],
+        dictionaries: Mapping[int, BaseCityDictionary],
+        current: BaseCityDictionary
+    ) -> "Game":
+        """Восстанавливаем игру; словари нужны, чтобы id городов значили то же, что при записи"""
+        kind, fingerprint, used, extra, last, deadline, *fields = record
+        dictionary = dictionaries.get(fingerprint)
+        if dictionary is not None:
+            pool = CityPool.restore(dictionary, used, extra)
+        else:
+            # Словарь игры уже выгружен: учет начинаем заново с последнего города
+            pool = CityPool(current)
+            if last:
+                pool.take(last)
+        game = object.__new__(SingleGame if kind == SINGLE else MultiGame)
+        game.pool = pool
+        game.last = last
+        game.deadline = None if deadline is None else time.monotonic() + deadline - time.time()
+        game._load_fields(fields)
+        return game
+
+
+def record_index(record: Any) -> Optional[Tuple[str, Optional[float], Optional[Tuple[int, PlayerId, bool]]]]:
+    """Что нужно знать об игре после перезапуска, без разбора учета городов
+
+    (вид игры, дедлайн по часам, (игрок 1, игрок 2, началась ли) - только
+    для мультиплеера). Порядок полей - как в to_record() и MultiGame._fields().
+    """
+    if not isinstance(record, list):
+        return None
+    kind, deadline, fields = record[0], record[5], record[6:]
+    return kind, deadline, ((fields[0], fields[1], fields[5]) if kind == MULTI else None)
+
+
+class SingleGame(Game):
+    """Одиночная игра против бота"""
+
+    __slots__ = ("difficulty", "player_score", "bot_score", "cheated", "turn_count")
+    kind = SINGLE
+
+    def __init__(self, pool: CityPool, difficulty: str):
+        super().__init__(pool)
+        self.difficulty = difficulty
+        self.player_score = 0
+        self.bot_score = 0
+        self.cheated = False
+        self.turn_count = 0
+
+    def _fields(self) -> List[Any]:
+        return [self.difficulty, self.player_score, self.bot_score, self.cheated, self.turn_count]
+
+    def _load_fields(self, fields: List[Any]):
+        self.difficulty, self.player_score, self.bot_score, self.cheated, self.turn_count = fields
+
+
+class MultiGame(Game):
+    """Игра двух игроков"""
+
+    __slots__ = ("player1", "player2", "score1", "score2", "current_turn", "started")
+    kind = MULTI
+
+    def __init__(self, pool: CityPool, player1: int, player2: PlayerId):
+        super().__init__(pool)
+        self.player1 = player1
+        self.player2 = player2
+        self.score1 = 0
+        self.score2 = 0
+        self.current_turn: PlayerId = player2  # Первый ход у приглашенного
+        self.started = False
+
+    def _fields(self) -> List[Any]:
+        return [self.player1, self.player2, self.score1, self.score2, self.current_turn, self.started]
+
+    def _load_fields(self, fields: List[Any]):
+        self.player1, self.player2, self.score1, self.score2, self.current_turn, self.started = fields
+
+    def is_player1(self, player: PlayerId) -> bool:
+        return str(player) == str(self.player1)
+
+    def opponent(self, player: PlayerId) -> PlayerId:
+        return self.player2 if self.is_player1(player) else self.player1
+
+    def score(self, player: PlayerId) -> int:
+        return self.score1 if self.is_player1(player) else self.score2
+
+    def add_point(self, player: PlayerId):
+        if self.is_player1(player):
+            self.score1 += 1
+        else:
+            self.score2 += 1
@@ -0,0 +1,337 @@
+"""Нагрузочный тест: симулированные игроки гоняют диспетчер бота без Telegram
+
+Использование: python load_test.py [--players 1000] [--multi 0.3] [--moves 20]
+    [--think 1.0] [--api-latency 0] [--telegram-limits]
+
+Бот запускается целиком (хранилище, таймеры, пул поиска ходов), но в
+отдельной временной папке: состояние, статистика и логи рабочего бота не
+затрагиваются. Вместо Bot API - локальная сессия, которая сразу отвечает
+на запросы и раскладывает сообщения бота по "входящим" игроков. Игроки
+читают ответы бота, как люди: ищут в них букву, города соперника и конец
+игры. Обновления подаются в dp.feed_update; время обработки каждого
+обновления и есть задержка обработчика.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import logging
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, TelegramMethod
+from aiogram.types import Chat, Message, ReplyKeyboardMarkup, Update, User
+
+# Файлы словаря и фактов копируются в рабочую папку бота
+DATA_FILES = ["cities.txt", "cities.bin", "city_scores.txt", "facts.bin"]
+MENU_BUTTON = "🎮 Одиночная игра"
+FIRST_PLAYER_ID = 1_000_000
+
+_CITY = re.compile(r"(?:Мой город|Соперник назвал|Первый город): <b>([^<]+)</b>")
+_LETTER = re.compile(r"на букву:? <b>([^<]+)</b>")
+_JOIN = re.compile(r"/join_([0-9a-z]+)")
+
+
+class Inbox:
+    """Сообщения бота одному игроку: (текст, вернулось ли главное меню)"""
+
+    def __init__(self):
+        self.items: List[Tuple[str, bool]] = []
+        self.ready = asyncio.Event()
+
+    def put(self, text: str, menu: bool):
+        self.items.append((text, menu))
+        self.ready.set()
+
+    def drain(self) -> List[Tuple[str, bool]]:
+        items, self.items = self.items, []
+        self.ready.clear()
+        return items
+
+    async def wait(self, timeout: float) -> List[Tuple[str, bool]]:
+        if not self.items:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        return self.drain()
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: сообщения попадают во входящие игроков"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.inboxes: Dict[int, Inbox] = defaultdict(Inbox)
+        self.requests = 0
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            return User(id=1, is_bot=True, first_name="Города", username="cities_load_bot")
+        if method.__returning__ is not Message:
+            return True
+        markup = getattr(method, "reply_markup", None)
+        menu = isinstance(markup, ReplyKeyboardMarkup) and any(
+            button.text == MENU_BUTTON for row in markup.keyboard for button in row
+        )
+        self.inboxes[method.chat_id].put(method.text, menu)
+        return Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(),
+            chat=Chat(id=method.chat_id, type="private"),
+            text=method.text
+        )
+
+    def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        # Бот файлы не скачивает; если начнет, тест должен упасть явно, а не молча
+        raise RuntimeError(f"Фейковый Bot API не отдает файлы: {url}")
+
+    async def close(self):
+        pass
+
+
+class LoadTest:
+    def __init__(self, bot_module, session: FakeSession, args: argparse.Namespace):
+        self.bot = bot_module
+        self.session = session
+        self.args = args
+        self.latencies: List[float] = []
+        self.updates = 0
+        self.moves = 0
+        self.games = {"single": 0, "multi": 0}
+        self.stuck = 0  # Игроки, не дождавшиеся ответа бота
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    async def send(self, user_id: int, text: str) -> List[Tuple[str, bool]]:
+        """Сообщение игрока боту; возвращает пришедшие за это время ответы"""
+        update = Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=User(id=user_id, is_bot=False, first_name="Игрок", username=f"player{user_id}"),
+                text=text
+            )
+        )
+        started = time.perf_counter()
+        await self.bot.dp.feed_update(self.bot.bot, update)
+        self.latencies.append(time.perf_counter() - started)
+        self.updates += 1
+        return self.session.inboxes[user_id].drain()
+
+    async def think(self):
+        # Живой игрок не пишет чаще лимита антифлуда
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.args.think)
+
+    def choose(self, letter: str, used: Set[str]) -> Optional[str]:
+        for idx in self.bot.CITIES.letter_ids(self.bot.normalize(letter)):
+            city = self.bot.CITIES.name(idx)
+            if city not in used:
+                return city
+        return None
+
+    async def single_player(self, user_id: int):
+        await self.send(user_id, "/start")
+        await self.send(user_id, MENU_BUTTON)
+        difficulty = random.choice(list(self.bot.DIFFICULTIES.values()))["name"]
+        replies = await self.send(user_id, difficulty)
+        used: Set[str] = set()
+        letter = None
+        for _ in range(self.args.moves):
+            for text, menu in replies:
+                if menu:
+                    self.games["single"] += 1
+                    return
+                used.update(_CITY.findall(text))
+                letter = next(iter(_LETTER.findall(text)), letter)
+            await self.think()
+            last = next(iter(_CITY.findall(replies[-1][0])), None) if replies else None
+            if last and last not in self.bot.CITIES:
+                replies = await self.send(user_id, "Фейк")  # Бот подсунул фейк
+                continue
+            city = self.choose(letter, used) if letter else None
+            if city is None:
+                break
+            used.add(city)
+            replies = await self.send(user_id, city)
+            self.moves += 1
+        if not any(menu for _, menu in replies):
+            await self.send(user_id, "🏳 Сдаться")
+        self.games["single"] += 1
+
+    async def multi_pair(self, host: int, guest: int):
+        inbox = self.session.inboxes[guest]
+        await self.send(guest, "/start")
+        await self.send(host, "/start")
+        await self.send(host, "👥 Мультиплеер")
+        await self.send(host, str(guest))
+        try:
+            invite = "".join(text for text, _ in await inbox.wait(self.args.timeout))
+        except asyncio.TimeoutError:
+            self.stuck += 1
+            return
+        match = _JOIN.search(invite)
+        if not match:
+            self.stuck += 1
+            return
+        await self.think()
+        used: Set[str] = set()
+        replies = await self.send(guest, f"/join_{match.group(1)}")
+        await asyncio.gather(
+            self.multi_player(guest, replies, used),
+            self.multi_player(host, [], used)
+        )
+        self.games["multi"] += 1
+
+    async def multi_player(self, user_id: int, replies: List[Tuple[str, bool]], used: Set[str]):
+        inbox = self.session.inboxes[user_id]
+        turns = 0
+        letter = None
+        while True:
+            while letter is None:
+                if not replies:
+                    try:
+                        replies = await inbox.wait(self.args.timeout)
+                    except asyncio.TimeoutError:
+                        self.stuck += 1
+                        return
+                for text, menu in replies:
+                    if menu:
+                        return
+                    used.update(_CITY.findall(text))
+                    if "Ваш ход" in text:
+                        letter = next(iter(_LETTER.findall(text)), letter)
+                replies = []
+            await self.think()
+            city = self.choose(letter, used)
+            if city is None or turns >= self.args.moves:
+                await self.send(user_id, "🏳 Сдаться")
+                return
+            used.add(city)
+            replies = await self.send(user_id, city)
+            if any(menu for _, menu in replies):
+                return
+            if any("принят" in text for text, _ in replies):
+                # Ход принят: ждем хода соперника, иначе пробуем другой город
+                turns += 1
+                self.moves += 1
+                letter, replies = None, []
+
+    async def run(self) -> float:
+        ids = itertools.count(FIRST_PLAYER_ID)
+        tasks = []
+        pairs = int(self.args.players * self.args.multi) // 2
+        for _ in range(pairs):
+            tasks.append(self.multi_pair(next(ids), next(ids)))
+        for _ in range(self.args.players - pairs * 2):
+            tasks.append(self.single_player(next(ids)))
+        random.shuffle(tasks)
+
+        async def delayed(task, delay: float):
+            # Игроки приходят не одновременно, а в течение ramp секунд
+            await asyncio.sleep(delay)
+            await task
+
+        started = time.perf_counter()
+        await asyncio.gather(*(delayed(task, random.uniform(0, self.args.ramp)) for task in tasks))
+        return time.perf_counter() - started
+
+
+def rss_mb() -> float:
+    """Текущая занятая процессом память (RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Не Linux: только пиковое значение
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 20
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def run(bot_module, args: argparse.Namespace):
+    session = FakeSession(args.api_latency)
+    if args.telegram_limits:
+        session.middleware(bot_module.outbound)
+    bot_module.bot.session = session
+    bot_module.PREFETCH_ENABLED = False  # Википедию под нагрузкой не трогаем
+
+    # Как в main(): без restore() хранилище со снимками не ведет журнал
+    if isinstance(bot_module.session_store, bot_module.SnapshotSessionStore):
+        await bot_module.restore_games()
+    await bot_module.on_startup()
+    gc.collect()
+    baseline = rss_mb()
+
+    test = LoadTest(bot_module, session, args)
+    elapsed = await test.run()
+    gc.collect()
+    final = rss_mb()
+
+    print(f"Игроки: {args.players}, игр: одиночных {test.games['single']}, мультиплеерных {test.games['multi']}")
+    print(f"Время: {elapsed:.1f} с, обновлений: {test.updates}, ходов игроков: {test.moves}")
+    print(f"Пропускная способность: {test.updates / elapsed:.0f} обновлений/с, {test.moves / elapsed:.0f} ходов/с")
+    print(
+        f"Задержка обработчика: p50 {percentile(test.latencies, 0.5) * 1000:.1f} мс, "
+        f"p99 {percentile(test.latencies, 0.99) * 1000:.1f} мс, "
+        f"макс {max(test.latencies, default=0) * 1000:.1f} мс"
+    )
+    print(f"Память: {baseline:.0f} -> {final:.0f} МБ (+{final - baseline:.1f} МБ)")
+    print(
+        f"Запросов к API: {session.requests}, зависших игроков: {test.stuck}, "
+        f"игр в реестре: {len(bot_module.registry)}, почтовых ящиков игр: {len(bot_module.actors)}"
+    )
+    if bot_module.search_pool:
+        print(f"Поисков хода сверх бюджета: {bot_module.search_pool.timeouts}")
+    await bot_module.on_shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--players", type=int, default=1000, help="число симулированных игроков")
+    parser.add_argument("--multi", type=float, default=0.3, help="доля игроков в мультиплеере")
+    parser.add_argument("--moves", type=int, default=20, help="ходов игрока за игру, потом сдается")
+    parser.add_argument("--think", type=float, default=1.0, help="средняя пауза между сообщениями игрока (с)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд приходят все игроки")
+    parser.add_argument("--timeout", type=float, default=30.0, help="сколько игрок ждет ответа бота (с)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа фейкового Bot API (с)")
+    parser.add_argument("--telegram-limits", action="store_true", help="пропускать запросы через лимиты Telegram")
+    args = parser.parse_args()
+
+    # Бот пишет состояние и логи в текущую папку: работаем во временной
+    source = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix="cities-load-")
+    for name in DATA_FILES:
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy2(os.path.join(source, name), workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, source)
+    try:
+        import bot as bot_module
+        logging.getLogger().setLevel(logging.WARNING)
+        bot_module.start_search_pool()
+        asyncio.run(run(bot_module, args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import random
+import zlib
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+ORDER = 3  # Длина контекста в символах
+START, END = "^", "$"
+MAX_LENGTH = 24
+
+# Контекст -> (следующие символы, накопленные частоты)
+Table = Dict[str, Tuple[str, List[int]]]
+
+
+class NameModel:
+    """Символьная марковская цепь для правдоподобных названий городов
+
+    Хранит частоты следующего символа для контекстов длиной до ORDER.
+    Если длинного контекста нет (например, буква, на которую не начинается
+    ни один город), используется более короткий. Генерация - один проход
+    по символам имени с бинарным поиском в маленькой таблице.
+    """
+
+    def __init__(self, table: Table):
+        self.table = table
+
+    @classmethod
+    def train(cls, names: Iterable[str]) -> "NameModel":
+        counts: Dict[str, Dict[str, int]] = {}
+        for name in names:
+            text = START * ORDER + name.lower() + END
+            for i in range(ORDER, len(text)):
+                for order in range(ORDER + 1):
+                    following = counts.setdefault(text[i - order:i], {})
+                    following[text[i]] = following.get(text[i], 0) + 1
+        table: Table = {}
+        for context, following in counts.items():
+            chars = "".join(sorted(following))
+            total, cumulative = 0, []
+            for char in chars:
+                total += following[char]
+                cumulative.append(total)
+            table[context] = (chars, cumulative)
+        return cls(table)
+
+    def to_bytes(self) -> bytes:
+        """Компактная форма: строки "контекст, символы, частоты", сжатые zlib"""
+        lines = [
+            f"{context}\t{chars}\t{','.join(map(str, cumulative))}"
+            for context, (chars, cumulative) in sorted(self.table.items())
+        ]
+        return zlib.compress("\n".join(lines).encode("utf-8"), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NameModel":
+        table: Table = {}
+        text = zlib.decompressobj().decompress(data).decode("utf-8")
+        for line in text.split("\n"):
+            if line:
+                context, chars, cumulative = line.split("\t")
+                table[context] = (chars, [int(c) for c in cumulative.split(",")])
+        return cls(table)
+
+    def _next(self, context: str) -> str:
+        for order in range(ORDER, -1, -1):
+            entry = self.table.get(context[len(context) - order:])
+            if entry:
+                chars, cumulative = entry
+                return chars[bisect_right(cumulative, random.randrange(cumulative[-1]))]
+        return END
+
+    def generate(self, letter: str) -> str:
+        """Название на букву letter (может совпасть с реальным городом)
+
+        Пустая строка, если цепь не закончила имя за MAX_LENGTH символов.
+        """
+        text = START * ORDER + letter.lower()
+        while True:
+            char = self._next(text)
+            if char == END:
+                break
+            if len(text) - ORDER >= MAX_LENGTH:
+                return ""
+            text += char
+        name = text[ORDER:].rstrip(" -")
+        # Слова из одной-двух букв ("на", "де") оставляем строчными
+        return "".join(
+            part.capitalize() if i == 0 or len(part.rstrip(" -")) > 2 else part
+            for i, part in enumerate(_split(name))
+        )
+
+
+def _split(name: str) -> List[str]:
+    """Слова вместе с разделителями после них"""
+    parts, start = [], 0
+    for i, char in enumerate(name):
+        if char in " -":
+            parts.append(name[start:i + 1])
+            start = i + 1
+    parts.append(name[start:])
+    return parts
@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты отправки: меньше - раньше
+PRIORITY_GAME = 0  # Ответы на ходы
+PRIORITY_SUMMARY = 1  # Итоги игр и прочие некритичные сообщения
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("send_priority", default=PRIORITY_GAME)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Приоритет для всех отправок внутри блока"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0  # Telegram попросил подождать (retry_after)
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Chat:
+    __slots__ = ("bucket", "lock", "users")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.lock = asyncio.Lock()
+        self.users = 0  # Сколько запросов в чат сейчас отправляется или ждет
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Общая очередь исходящих запросов с учетом лимитов Telegram
+
+    Подключается к сессии бота и пропускает через себя каждый запрос с
+    chat_id. В одном чате запросы идут по очереди и не чаще лимита чата;
+    общий лимит раздается ожидающим по приоритету, так что ответы на ходы
+    обгоняют итоги игр. На 429 чат ставится на паузу retry_after, и запрос
+    повторяется.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+        max_idle_chats: int = 10000
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_idle_chats = max_idle_chats
+        self._bucket = TokenBucket(rate, rate, 0.0)
+        self._chats: Dict[int, _Chat] = {}
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            # @username каналов и запросы без чата не ограничиваем
+            return await make_request(bot, method)
+
+        loop = asyncio.get_running_loop()
+        chat = self._chat(chat_id, loop.time())
+        chat.users += 1
+        try:
+            async with chat.lock:
+                for attempt in range(self.max_retries + 1):
+                    await self._acquire(chat.bucket)
+                    try:
+                        return await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        if attempt == self.max_retries:
+                            raise
+                        logger.warning(f"Лимит Telegram для чата {chat_id}: ждем {e.retry_after} с")
+                        chat.bucket.blocked_until = loop.time() + e.retry_after
+        finally:
+            chat.users -= 1
+
+    def _chat(self, chat_id: int, now: float) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self.max_idle_chats:
+                self._prune(now)
+            # Отрицательные id - группы: у них лимит строже
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            chat = self._chats[chat_id] = _Chat(bucket)
+        return chat
+
+    def _prune(self, now: float):
+        # Простаивающий чат с полным ведром ничем не отличается от нового
+        for chat_id, chat in list(self._chats.items()):
+            if not chat.users and chat.bucket.delay(now) == 0 and chat.bucket.tokens >= chat.bucket.capacity:
+                del self._chats[chat_id]
+
+    async def _acquire(self, bucket: TokenBucket):
+        loop = asyncio.get_running_loop()
+        delay = bucket.delay(loop.time())
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = bucket.delay(loop.time())
+
+        # Общий лимит раздает run() по приоритету
+        future = loop.create_future()
+        heapq.heappush(self._waiting, (_priority.get(), next(self._counter), future))
+        self._wakeup.set()
+        await future
+        bucket.delay(loop.time())
+        bucket.take()
+
+    async def run(self):
+        """Раздача общего лимита ожидающим запросам"""
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._waiting and self._waiting[0][2].done():
+                heapq.heappop(self._waiting)  # Ожидание отменено
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._bucket.delay(loop.time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            self._bucket.take()
+            future.set_result(None)
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Фоновый прогрев кеша описаний городов, названных в игре"""
+
+    def __init__(
+        self,
+        warm: Callable[[str], Awaitable[Any]],
+        concurrency: int = 4,
+        max_pending: int = 100
+    ):
+        self.warm = warm
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[Hashable, Set[asyncio.Task]] = {}
+        self._pending = 0
+
+    def schedule(self, game_key: Hashable, city: str):
+        """Запускаем прогрев, не дожидаясь результата"""
+        if self._pending >= self.max_pending:
+            return
+        task = asyncio.create_task(self._run(city))
+        self._pending += 1
+        tasks = self._tasks.setdefault(game_key, set())
+        tasks.add(task)
+        task.add_done_callback(lambda t: self._done(game_key, t))
+
+    def cancel(self, game_key: Hashable):
+        """Отменяем прогрев для завершенной игры
+
+        Загрузку обрывает сам warm(), если ее больше никто не ждет
+        (так делает WikiCache.get).
+        """
+        for task in self._tasks.pop(game_key, ()):
+            task.cancel()
+
+    async def _run(self, city: str):
+        async with self._semaphore:
+            try:
+                await self.warm(city)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Не удалось прогреть {city}: {e}")
+
+    def _done(self, game_key: Hashable, task: asyncio.Task):
+        self._pending -= 1
+        tasks = self._tasks.get(game_key)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[game_key]
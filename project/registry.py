@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sessions import SessionStore
+
+SEQUENCE_KEY = "game_seq"
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(number: int) -> str:
+    digits = []
+    while number:
+        number, rest = divmod(number, 36)
+        digits.append(_DIGITS[rest])
+    return "".join(reversed(digits)) or "0"
+
+
+class GameRegistry:
+    """Индексы мультиплеерных игр: по ID, по игроку и по стадии
+
+    ID выдаются из общего счетчика в хранилище блоками по block штук,
+    поэтому не повторяются ни между воркерами, ни после перезапуска, и
+    остаются короткими (base36). Ожидающие приглашения лежат в порядке
+    создания, так что просроченные находятся с начала очереди.
+    """
+
+    def __init__(self, store: SessionStore, invite_ttl: float = 600.0, block: int = 1000):
+        self.store = store
+        self.invite_ttl = invite_ttl
+        self.block = block
+        self._next = 0
+        self._limit = 0
+        self._reserve_lock = asyncio.Lock()
+        self._players: Dict[str, List[int]] = {}  # ID игры -> игроки
+        self._by_player: Dict[int, str] = {}
+        self._pending: "OrderedDict[str, float]" = OrderedDict()  # ID -> время создания
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    async def new_id(self) -> str:
+        """Новый уникальный ID игры"""
+        if self._next >= self._limit:
+            async with self._reserve_lock:
+                if self._next >= self._limit:
+                    await self._reserve()
+        game_id = _base36(self._next)
+        self._next += 1
+        return game_id
+
+    async def _reserve(self):
+        while True:
+            record, version = await self.store.load(SEQUENCE_KEY)
+            start = record["next"] if record else 1
+            if await self.store.save(SEQUENCE_KEY, {"next": start + self.block}, version):
+                self._next, self._limit = start, start + self.block
+                return
+
+    def add_pending(self, game_id: str, player1: int, player2: int, created: Optional[float] = None):
+        """Новое приглашение"""
+        self._players[game_id] = [player1, player2]
+        self._pending[game_id] = time.monotonic() if created is None else created
+        self._by_player[player1] = game_id
+
+    def start(self, game_id: str):
+        """Приглашение принято"""
+        players = self._players.get(game_id)
+        if players is None:
+            return
+        self._pending.pop(game_id, None)
+        for player in players:
+            self._by_player[player] = game_id
+
+    def add_started(self, game_id: str, player1: int, player2: int):
+        """Уже идущая игра (при восстановлении)"""
+        self._players[game_id] = [player1, player2]
+        self.start(game_id)
+
+    def remove(self, game_id: str):
+        players = self._players.pop(game_id, ())
+        self._pending.pop(game_id, None)
+        for player in players:
+            # У игрока за это время могла появиться новая игра
+            if self._by_player.get(player) == game_id:
+                del self._by_player[player]
+
+    def game_of(self, player: int) -> Optional[str]:
+        """Последняя игра игрока"""
+        return self._by_player.get(player)
+
+    def expired_invites(self, now: Optional[float] = None) -> List[str]:
+        """Приглашения старше invite_ttl (просматриваются только они)"""
+        deadline = (time.monotonic() if now is None else now) - self.invite_ttl
+        expired = []
+        for game_id, created in self._pending.items():
+            if created > deadline:
+                break
+            expired.append(game_id)
+        return expired
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+from dictionary import CityPool, MappedCityDictionary
+from strategy import MoveEngine
+
+logger = logging.getLogger(__name__)
+
+# Состояние процесса-исполнителя: словари по отпечатку и движок
+_worker_dictionaries: Dict[int, MappedCityDictionary] = {}
+_worker_engine: Optional[MoveEngine] = None
+_worker_path: Optional[str] = None
+
+
+def _init_worker(path: str, last_letter: Callable[[str], str]):
+    global _worker_engine, _worker_path
+    _worker_path = path
+    _worker_engine = MoveEngine(last_letter)
+    _load(path)
+
+
+def _load(path: str) -> MappedCityDictionary:
+    dictionary = MappedCityDictionary(path)
+    if dictionary.fingerprint not in _worker_dictionaries:
+        _worker_dictionaries[dictionary.fingerprint] = dictionary
+        _worker_engine.graph(dictionary)
+    return _worker_dictionaries[dictionary.fingerprint]
+
+
+def _search(fingerprint: int, used: str, letter: str, deadline: float) -> Tuple[bool, Optional[str]]:
+    """Поиск хода в процессе-исполнителе: (ход найден, город)"""
+    budget = deadline - time.time()
+    if budget <= 0:
+        # Задача простояла в очереди весь срок: ход уже считается на месте
+        return False, None
+    dictionary = _worker_dictionaries.get(fingerprint)
+    if dictionary is None:
+        # Словарь могли пересобрать: файл уже новый, старые игры не узнаем
+        dictionary = _load(_worker_path)
+        if dictionary.fingerprint != fingerprint:
+            return False, None
+    pool = CityPool.restore(dictionary, used, [])
+    _worker_engine.budget = budget
+    return True, _worker_engine.choose(pool, letter)
+
+
+class SearchPool:
+    """Поиск ходов бота в пуле процессов
+
+    Каждый процесс отображает скомпилированный словарь в память (страницы
+    общие) и держит свой граф букв, так что цикл событий не тратит время
+    на перебор. Если ответ не пришел за budget + grace секунд, ход
+    делается на месте случайным городом. Срок общий с очередью: задача,
+    простоявшая в очереди, исполнителя не занимает. cancel() прерывает
+    ожидание поисков игры, которая заканчивается.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        last_letter: Callable[[str], str],
+        workers: int = 2,
+        budget: float = 0.05,
+        grace: float = 0.05
+    ):
+        self.budget = budget
+        self.grace = grace
+        # fork: исполнителям не нужно заново импортировать главный модуль бота
+        self._executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(path, last_letter)
+        )
+        self._running: Dict[Hashable, Set[asyncio.Future]] = {}
+        self.timeouts = 0
+
+    async def choose(self, pool: CityPool, letter: str, game_key: Hashable) -> Optional[str]:
+        """Ход бота для игры; при любой неудаче - случайный свободный город
+
+        None - городов на букву нет или игра закончилась во время поиска.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, _search, pool.dictionary.fingerprint, pool.dump()[0], letter, time.time() + self.budget
+        )
+        running = self._running.setdefault(game_key, set())
+        running.add(future)
+        try:
+            found, city = await asyncio.wait_for(future, self.budget + self.grace)
+            if found and (city is None or not pool.is_used(city)):
+                return city
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            return None  # Поиск отменен через cancel(): игра уже закончена
+        except Exception as e:
+            logger.error(f"Ошибка поиска хода: {e}")
+        finally:
+            running.discard(future)
+            if not running and self._running.get(game_key) is running:
+                del self._running[game_key]
+        # Полный перебор на месте занял бы цикл событий на десятки мс
+        return pool.pick(letter)
+
+    def cancel(self, game_key: Hashable):
+        """Игра заканчивается: прерываем ожидание ее поисков"""
+        for future in self._running.pop(game_key, ()):
+            future.cancel()
+
+    def warm(self):
+        """Запускаем исполнителей заранее, до первого хода"""
+        self._executor.submit(len, ())
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,258 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+# Версия 0 означает "записи нет": сохранение с ней только создает запись
+NEW = 0
+
+# Запись - JSON-совместимое значение: словарь или компактный список полей
+Record = Union[Dict[str, Any], List[Any]]
+
+
+class SessionStore(ABC):
+    """Хранилище состояния игр с оптимистичными блокировками
+
+    Каждая запись хранится вместе с версией. save() проходит, только если
+    версия не изменилась с момента load(), иначе возвращает False, и
+    обработчик должен перечитать состояние.
+    """
+
+    @abstractmethod
+    async def load(self, key: str) -> Tuple[Optional[Record], int]:
+        """Запись и ее версия; для отсутствующей записи - (None, NEW)"""
+
+    @abstractmethod
+    async def save(self, key: str, value: Record, version: int) -> bool:
+        """Записываем, если версия все еще version"""
+
+    @abstractmethod
+    async def delete(self, key: str, version: Optional[int] = None) -> bool:
+        """Удаляем запись; с version - только если ее никто не изменил"""
+
+    @abstractmethod
+    async def keys(self) -> List[str]:
+        """Все ключи (для восстановления таймеров и индексов после перезапуска)"""
+
+    async def put(self, key: str, value: Record):
+        """Записываем без проверки версии (новая игра поверх старой)"""
+        while True:
+            _, version = await self.load(key)
+            if await self.save(key, value, version):
+                return
+
+    async def close(self):
+        pass
+
+
+def _encode(value: Record) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data: bytes) -> Record:
+    return json.loads(data)
+
+
+class MemorySessionStore(SessionStore):
+    """Хранилище в памяти процесса (один воркер)"""
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[int, bytes]] = {}
+
+    async def load(self, key: str) -> Tuple[Optional[Record], int]:
+        record = self.records.get(key)
+        if record is None:
+            return None, NEW
+        # Храним сериализованным: изменения копии не видны без save()
+        return _decode(record[1]), record[0]
+
+    async def save(self, key: str, value: Record, version: int) -> bool:
+        current = self.records.get(key)
+        if (current[0] if current else NEW) != version:
+            return False
+        self.records[key] = (version + 1, _encode(value))
+        return True
+
+    async def delete(self, key: str, version: Optional[int] = None) -> bool:
+        current = self.records.get(key)
+        if current is None or (version is not None and current[0] != version):
+            return False
+        del self.records[key]
+        return True
+
+    async def keys(self) -> List[str]:
+        return list(self.records)
+
+    def items(self, prefixes: Tuple[str, ...]) -> Iterator[Tuple[str, Record]]:
+        """Записи с ключами на prefixes без await: для разбора в потоке до начала работы"""
+        for key, (_, data) in list(self.records.items()):
+            if key.startswith(prefixes):
+                yield key, _decode(data)
+
+
+class RedisError(Exception):
+    """Ошибка, которую вернул сервер Redis"""
+
+
+# Сравнение версии и запись выполняются атомарно на стороне сервера
+_SAVE_SCRIPT = """
+local v = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if v ~= tonumber(ARGV[1]) then return 0 end
+redis.call('HSET', KEYS[1], 'v', v + 1, 'd', ARGV[2])
+return 1
+"""
+
+_DELETE_SCRIPT = """
+local v = redis.call('HGET', KEYS[1], 'v')
+if not v then return 0 end
+if ARGV[1] ~= '' and tonumber(v) ~= tonumber(ARGV[1]) then return 0 end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Хранилище в Redis (или любом сервере с протоколом RESP)
+
+    Запись - хеш с полями v (версия) и d (JSON). Несколько воркеров
+    бота могут работать с одним сервером.
+    """
+
+    def __init__(self, url: str, pool_size: int = 10, prefix: str = "cities:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self._pool: "asyncio.Queue[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(pool_size)
+        self._connections: List[asyncio.StreamWriter] = []
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self._connections.append(writer)
+        connection = (reader, writer)
+        if self.password:
+            await self._call(connection, "AUTH", self.password)
+        if self.db:
+            await self._call(connection, "SELECT", self.db)
+        return connection
+
+    async def command(self, *args: Any) -> Any:
+        """Выполняем команду на свободном соединении из пула"""
+        async with self._slots:
+            connection = self._pool.get_nowait() if not self._pool.empty() else await self._connect()
+            try:
+                result = await self._call(connection, *args)
+            except RedisError:
+                self._pool.put_nowait(connection)
+                raise
+            except BaseException:
+                # Соединение в неизвестном состоянии - не возвращаем его в пул
+                connection[1].close()
+                self._connections.remove(connection[1])
+                raise
+            self._pool.put_nowait(connection)
+            return result
+
+    async def _call(self, connection, *args: Any) -> Any:
+        reader, writer = connection
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        writer.write(b"".join(parts))
+        await writer.drain()
+        return await self._read(reader)
+
+    async def _read(self, reader: asyncio.StreamReader) -> Any:
+        line = await reader.readuntil(b"\r\n")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read(reader) for _ in range(length)]
+        raise RedisError(f"Неожиданный ответ: {line!r}")
+
+    async def load(self, key: str) -> Tuple[Optional[Record], int]:
+        version, data = await self.command("HMGET", self.prefix + key, "v", "d")
+        if version is None or data is None:
+            return None, NEW
+        return _decode(data), int(version)
+
+    async def save(self, key: str, value: Record, version: int) -> bool:
+        result = await self.command("EVAL", _SAVE_SCRIPT, 1, self.prefix + key, version, _encode(value))
+        return result == 1
+
+    async def delete(self, key: str, version: Optional[int] = None) -> bool:
+        result = await self.command("EVAL", _DELETE_SCRIPT, 1, self.prefix + key, "" if version is None else version)
+        return result == 1
+
+    async def keys(self) -> List[str]:
+        # SCAN не блокирует сервер, в отличие от KEYS
+        found, cursor = [], "0"
+        while True:
+            cursor, batch = await self.command("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 1000)
+            found.extend(key.decode("utf-8")[len(self.prefix):] for key in batch)
+            cursor = cursor.decode()
+            if cursor == "0":
+                return found
+
+    async def close(self):
+        for writer in self._connections:
+            writer.close()
+        self._connections.clear()
+
+
+class SessionFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх SessionStore"""
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"fsm:{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+
+    async def _update(self, key: StorageKey, field: str, value: Any):
+        # Состояние и данные FSM меняет только сам пользователь: повтор на случай гонки
+        while True:
+            record, version = await self.store.load(self._key(key))
+            record = record or {"state": None, "data": {}}
+            record[field] = value
+            if await self.store.save(self._key(key), record, version):
+                return
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._update(key, "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record, _ = await self.store.load(self._key(key))
+        return record["state"] if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._update(key, "data", dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record, _ = await self.store.load(self._key(key))
+        return dict(record["data"]) if record else {}
+
+    async def close(self) -> None:
+        await self.store.close()
@@ -0,0 +1,229 @@
+import asyncio
+import glob
+import logging
+import os
+import struct
+import threading
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from sessions import MemorySessionStore
+
+logger = logging.getLogger(__name__)
+
+# Снимок: заголовок (магия, версия формата, поколение, число записей) и записи
+# (длина ключа, версия, длина данных, ключ, данные). Журнал поколения N
+# содержит изменения после снимка поколения N теми же записями с кодом операции.
+MAGIC = b"SNAP"
+VERSION = 1
+OP_SAVE = 1
+OP_DELETE = 2
+_HEADER = struct.Struct("=4sIQQ")
+_RECORD = struct.Struct("=IQI")
+_JOURNAL_RECORD = struct.Struct("=BIQI")
+
+
+def _read_snapshot(path: str) -> Tuple[int, Dict[str, Tuple[int, bytes]]]:
+    """Читаем снимок целиком: (поколение, записи)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, generation, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Неподдерживаемый формат снимка: {path}")
+    records = {}
+    pos = _HEADER.size
+    for _ in range(count):
+        key_len, record_version, data_len = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        key = data[pos:pos + key_len].decode("utf-8")
+        pos += key_len
+        records[key] = (record_version, data[pos:pos + data_len])
+        pos += data_len
+    return generation, records
+
+
+def _replay_journal(path: str, records: Dict[str, Tuple[int, bytes]]) -> int:
+    """Применяем журнал к записям; недописанный хвост (падение) отбрасываем"""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = applied = 0
+    while pos + _JOURNAL_RECORD.size <= len(data):
+        op, key_len, record_version, data_len = _JOURNAL_RECORD.unpack_from(data, pos)
+        end = pos + _JOURNAL_RECORD.size + key_len + data_len
+        if end > len(data):
+            break
+        start = pos + _JOURNAL_RECORD.size
+        key = data[start:start + key_len].decode("utf-8")
+        if op == OP_SAVE:
+            records[key] = (record_version, data[start + key_len:end])
+        else:
+            records.pop(key, None)
+        pos = end
+        applied += 1
+    return applied
+
+
+class SnapshotSessionStore(MemorySessionStore):
+    """Хранилище в памяти, которое переживает перезапуск бота
+
+    Каждое изменение дописывается в журнал (на диск - пачкой раз в
+    flush_interval секунд), а раз в snapshot_interval секунд все записи
+    сохраняются снимком, после чего старый журнал удаляется. Записи уже
+    сериализованы, поэтому снимок - это только их склейка, и она
+    выполняется в отдельном потоке. Пока не вызван restore(), журнала нет
+    и хранилище ничего не сохраняет, как обычное хранилище в памяти.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        snapshot_interval: float = 300.0,
+        flush_interval: float = 1.0,
+        max_journal: int = 64 * 1024 * 1024
+    ):
+        super().__init__()
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.flush_interval = flush_interval
+        self.max_journal = max_journal
+        self.generation = 0
+        self._buffer: List[bytes] = []
+        self._journal: Optional[BinaryIO] = None
+        self._journal_size = 0
+        self._io_lock = asyncio.Lock()
+        self._file_lock = threading.Lock()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"journal.{generation}.bin")
+
+    def _journals(self) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, "journal.*.bin")):
+            try:
+                found.append((int(os.path.basename(path).split(".")[1]), path))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def restore(self) -> int:
+        """Загружаем снимок и журналы после него; вызывать до начала работы"""
+        generation = 0
+        if os.path.exists(self.snapshot_path):
+            generation, self.records = _read_snapshot(self.snapshot_path)
+        replayed = 0
+        for journal_generation, path in self._journals():
+            # Журналы старше снимка уже в нем (не удалены из-за падения)
+            if journal_generation >= generation:
+                replayed += _replay_journal(path, self.records)
+        last = self._journals()
+        self.generation = max(generation, last[-1][0] if last else 0)
+        # Продолжаем писать в новый журнал: хвост старого мог быть недописан
+        self.generation += 1
+        self._open_journal()
+        logger.info(
+            f"Восстановлено {len(self.records)} записей "
+            f"(снимок поколения {generation}, из журнала {replayed})"
+        )
+        return len(self.records)
+
+    def _open_journal(self):
+        self._journal = open(self._journal_path(self.generation), "ab")
+        self._journal_size = self._journal.tell()
+
+    async def save(self, key: str, value, version: int) -> bool:
+        if not await super().save(key, value, version):
+            return False
+        if self._journal is None:
+            return True
+        new_version, data = self.records[key]
+        encoded = key.encode("utf-8")
+        self._buffer.append(_JOURNAL_RECORD.pack(OP_SAVE, len(encoded), new_version, len(data)) + encoded + data)
+        return True
+
+    async def delete(self, key: str, version: Optional[int] = None) -> bool:
+        if not await super().delete(key, version):
+            return False
+        if self._journal is None:
+            return True
+        encoded = key.encode("utf-8")
+        self._buffer.append(_JOURNAL_RECORD.pack(OP_DELETE, len(encoded), 0, 0) + encoded)
+        return True
+
+    async def run(self):
+        """Периодическая запись журнала и снимков"""
+        loop = asyncio.get_running_loop()
+        last_snapshot = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if (loop.time() - last_snapshot >= self.snapshot_interval
+                        or self._journal_size >= self.max_journal):
+                    await self.snapshot()
+                    last_snapshot = loop.time()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения игр: {e}")
+
+    async def flush(self):
+        """Дописываем накопленные изменения в журнал"""
+        async with self._io_lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buffer or self._journal is None:
+            return
+        chunk, self._buffer = b"".join(self._buffer), []
+        await asyncio.to_thread(self._write_journal, chunk)
+
+    def _write_journal(self, chunk: bytes):
+        with self._file_lock:
+            self._journal.write(chunk)
+            self._journal.flush()
+            self._journal_size += len(chunk)
+
+    async def snapshot(self):
+        """Снимок всех записей; изменения во время записи идут в новый журнал"""
+        async with self._io_lock:
+            await self._flush()
+            # Копия словаря - единственная работа в цикле событий: записи неизменяемы
+            records = dict(self.records)
+            self.generation += 1
+            generation = self.generation
+            await asyncio.to_thread(self._rotate_journal)
+            await asyncio.to_thread(self._write_snapshot, generation, records)
+            for journal_generation, path in self._journals():
+                if journal_generation < generation:
+                    os.remove(path)
+
+    def _rotate_journal(self):
+        with self._file_lock:
+            if self._journal is not None:
+                self._journal.close()
+            self._open_journal()
+
+    def _write_snapshot(self, generation: int, records: Dict[str, Tuple[int, bytes]]):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, generation, len(records)))
+            for key, (version, data) in records.items():
+                encoded = key.encode("utf-8")
+                f.write(_RECORD.pack(len(encoded), version, len(data)))
+                f.write(encoded)
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def close(self):
+        if self._closed or self._journal is None:
+            return
+        self._closed = True
+        await self.snapshot()
+        with self._file_lock:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StatsStore:
+    """Статистика игроков в SQLite (WAL) с пакетной записью
+
+    Результаты игр копятся в памяти и раз в flush_interval секунд
+    записываются одной транзакцией в отдельном потоке.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, cache_size: int = 10000):
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Dict[str, int]]" = OrderedDict()
+        self._pending: Dict[int, List[int]] = {}  # user_id -> [победы, поражения]
+        self._flush_lock = asyncio.Lock()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "user_id INTEGER PRIMARY KEY, "
+            "wins INTEGER NOT NULL DEFAULT 0, "
+            "losses INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.commit()
+
+    def record(self, user_id: int, is_win: bool):
+        """Учитываем результат игры (без ожидания записи на диск)"""
+        delta = self._pending.setdefault(user_id, [0, 0])
+        delta[0 if is_win else 1] += 1
+        stats = self._cache.get(user_id)
+        if stats is not None:
+            stats["wins" if is_win else "losses"] += 1
+
+    async def get(self, user_id: int) -> Dict[str, int]:
+        """Статистика игрока: из кеша или из базы"""
+        stats = self._cache.get(user_id)
+        if stats is not None:
+            self._cache.move_to_end(user_id)
+            return dict(stats)
+
+        # Чтение не должно пересечься с записью пачки, иначе она учтется дважды
+        async with self._flush_lock:
+            row = await asyncio.to_thread(self._load, user_id)
+            stats = self._cache.get(user_id)  # Пока читали, мог заполнить другой запрос
+            if stats is None:
+                stats = {"wins": row[0], "losses": row[1]}
+                # Добавляем то, что еще не дошло до базы
+                delta = self._pending.get(user_id)
+                if delta:
+                    stats["wins"] += delta[0]
+                    stats["losses"] += delta[1]
+                self._cache[user_id] = stats
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return dict(stats)
+
+    async def run(self):
+        """Периодическая запись накопленных результатов"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи статистики: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                rows = [(user_id, d[0], d[1]) for user_id, d in batch.items()]
+                await asyncio.to_thread(self._write, rows)
+            except BaseException:
+                # Не теряем результаты: вернем их в очередь следующей записи
+                for user_id, delta in batch.items():
+                    pending = self._pending.setdefault(user_id, [0, 0])
+                    pending[0] += delta[0]
+                    pending[1] += delta[1]
+                raise
+
+    async def close(self):
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def _load(self, user_id: int) -> Tuple[int, int]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT wins, losses FROM stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row or (0, 0)
+
+    def _write(self, rows: List[Tuple[int, int, int]]):
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT INTO stats (user_id, wins, losses) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "wins = wins + excluded.wins, losses = losses + excluded.losses",
+                rows
+            )
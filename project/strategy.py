@@ -0,0 +1,158 @@
+import random
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from dictionary import BaseCityDictionary, CityPool, normalize
+
+WIN = 1_000_000  # Оценка позиции, в которой соперник не может ходить
+MAX_DEPTH = 8  # Глубина, дальше которой не ищем даже при запасе времени
+
+
+class _Timeout(Exception):
+    pass
+
+
+class LetterGraph:
+    """Граф переходов между буквами: города сгруппированы по (первая, последняя) буква
+
+    Для игры все города одной группы равноценны: после любого из них
+    соперник ходит на одну и ту же букву. Поэтому перебор ходов идет
+    по группам, а не по городам.
+    """
+
+    def __init__(self, dictionary: BaseCityDictionary, last_letter: Callable[[str], str]):
+        self.dictionary = dictionary
+        self.letters: List[str] = []
+        self._letter_index: Dict[str, int] = {}
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for idx in range(len(dictionary)):
+            start = self._index(dictionary.key(idx)[0])
+            end = self._index(normalize(last_letter(dictionary.name(idx))))
+            groups.setdefault((start, end), []).append(idx)
+
+        size = len(self.letters)
+        # ids и размер каждой группы, группа каждого города (start * size + end);
+        # edges[s] - буквы, на которые можно уйти с s
+        self.ids: Dict[Tuple[int, int], List[int]] = groups
+        self.totals: List[List[int]] = [[0] * size for _ in range(size)]
+        self.group_of = array("I", bytes(4 * len(dictionary)))
+        self.edges: List[List[int]] = [[] for _ in range(size)]
+        for (start, end), ids in groups.items():
+            self.totals[start][end] = len(ids)
+            for idx in ids:
+                self.group_of[idx] = start * size + end
+            self.edges[start].append(end)
+
+    def _index(self, letter: str) -> int:
+        index = self._letter_index.get(letter)
+        if index is None:
+            index = self._letter_index[letter] = len(self.letters)
+            self.letters.append(letter)
+        return index
+
+    def letter_id(self, letter: str) -> Optional[int]:
+        """Номер буквы (уже нормализованной) в графе"""
+        return self._letter_index.get(letter)
+
+    def counts(self, pool: CityPool) -> List[List[int]]:
+        """Сколько городов осталось в каждой группе
+
+        Из размеров групп вычитаются только названные города, так что
+        время зависит от длины игры, а не от размера словаря.
+        """
+        size = len(self.letters)
+        counts = [row[:] for row in self.totals]
+        for idx in pool.used_ids():
+            start, end = divmod(self.group_of[idx], size)
+            counts[start][end] -= 1
+        return counts
+
+
+class MoveEngine:
+    """Выбор хода бота: уводим соперника на буквы, где города кончаются
+
+    Перебор с альфа-бета отсечением по группам городов с итеративным
+    углублением. Каждый ход ограничен budget секундами: по истечении
+    берется лучший ход последней полностью просчитанной глубины. Пока граф
+    словаря не построен (graph() в фоне), ход - случайный свободный город.
+    """
+
+    def __init__(self, last_letter: Callable[[str], str], budget: float = 0.003):
+        self.last_letter = last_letter
+        self.budget = budget
+        self._graphs: "WeakKeyDictionary[BaseCityDictionary, LetterGraph]" = WeakKeyDictionary()
+
+    def graph(self, dictionary: BaseCityDictionary) -> LetterGraph:
+        """Граф букв словаря; на большом словаре строится долго, вызывать вне цикла событий"""
+        graph = self._graphs.get(dictionary)
+        if graph is None:
+            graph = self._graphs[dictionary] = LetterGraph(dictionary, self.last_letter)
+        return graph
+
+    def choose(self, pool: CityPool, letter: str) -> Optional[str]:
+        """Лучший найденный город на букву или None, если городов нет"""
+        # Подготовка позиции тоже идет в счет времени хода
+        deadline = time.perf_counter() + self.budget
+        graph = self._graphs.get(pool.dictionary)
+        if graph is None:
+            # Граф еще строится в фоне: строить его здесь - сотни мс на большом словаре
+            return pool.pick(letter)
+        start = graph.letter_id(normalize(letter))
+        if start is None:
+            return None
+        counts = graph.counts(pool)
+        moves = [end for end in graph.edges[start] if counts[start][end]]
+        if not moves:
+            return None
+
+        best = random.choice(moves)
+        try:
+            for depth in range(1, MAX_DEPTH + 1):
+                best = self._root(counts, start, moves, depth, deadline)
+        except _Timeout:
+            pass
+        return self._city(graph, pool, start, best)
+
+    def _root(self, counts: List[List[int]], start: int, moves: List[int], depth: int, deadline: float) -> int:
+        # Случайный порядок: из равных по оценке ходов бот выбирает разные
+        random.shuffle(moves)
+        best_move, best_score = moves[0], -WIN - 1
+        for end in moves:
+            counts[start][end] -= 1
+            score = -self._search(counts, end, depth - 1, -WIN - 1, -best_score, deadline)
+            counts[start][end] += 1
+            if score > best_score:
+                best_move, best_score = end, score
+        return best_move
+
+    def _search(self, counts: List[List[int]], letter: int, depth: int, alpha: int, beta: int, deadline: float) -> int:
+        """Оценка для того, кто ходит с буквы letter"""
+        if time.perf_counter() > deadline:
+            raise _Timeout
+        row = counts[letter]
+        options = sum(row)
+        if not options:
+            return -WIN
+        if depth == 0:
+            return options
+        for end, count in enumerate(row):
+            if not count:
+                continue
+            row[end] -= 1
+            score = -self._search(counts, end, depth - 1, -beta, -alpha, deadline)
+            row[end] += 1
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    @staticmethod
+    def _city(graph: LetterGraph, pool: CityPool, start: int, end: int) -> str:
+        ids = graph.ids[start, end]
+        for _ in range(8):
+            idx = ids[random.randrange(len(ids))]
+            if idx not in pool:
+                return graph.dictionary.name(idx)
+        return graph.dictionary.name(random.choice([idx for idx in ids if idx not in pool]))
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Модули бота лежат плоско в project/ и импортируются по имени
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    """Модуль бота, импортированный во временной папке
+
+    Бот пишет состояние, кеши и логи в текущую папку, поэтому она остается
+    временной до конца тестов.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot"))
+    try:
+        import bot
+        yield bot
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def loop():
+    """Цикл событий теста: на нем же фикстуры поднимают свои стенды"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    # Как asyncio.run(): фоновые задачи теста (обработчики, таймеры) отменяем
+    pending = asyncio.all_tasks(loop)
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.wait(pending))
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
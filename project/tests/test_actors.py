@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from actors import GameActors
+
+
+def test_actions_of_one_game_run_in_order(loop):
+    actors = GameActors()
+    log = []
+
+    async def action(key, i):
+        log.append((key, i, "начало"))
+        await asyncio.sleep(0.01)
+        log.append((key, i, "конец"))
+        return i
+
+    async def check():
+        results = await asyncio.gather(*(actors.call("a", action, "a", i) for i in range(3)))
+        assert results == [0, 1, 2]
+        assert log == [("a", i, stage) for i in range(3) for stage in ("начало", "конец")]
+
+        # Разные игры не ждут друг друга
+        log.clear()
+        await asyncio.gather(actors.call("a", action, "a", 0), actors.call("b", action, "b", 0))
+        assert [stage for _, _, stage in log] == ["начало", "начало", "конец", "конец"]
+
+    loop.run_until_complete(check())
+
+
+def test_action_error_reaches_caller_and_mailbox_survives(loop):
+    actors = GameActors()
+
+    async def fail():
+        raise ValueError("плохой ход")
+
+    async def ok():
+        return "ок"
+
+    async def check():
+        with pytest.raises(ValueError):
+            await actors.call("a", fail)
+        assert await actors.call("a", ok) == "ок"
+        assert len(actors) == 1
+
+    loop.run_until_complete(check())
+
+
+def test_idle_mailbox_is_torn_down(loop):
+    actors = GameActors(idle_timeout=0.05)
+
+    async def ok():
+        return "ок"
+
+    async def check():
+        await actors.call("a", ok)
+        task = actors._mailboxes["a"].task
+        await asyncio.sleep(0.1)
+        assert len(actors) == 0
+        assert task.done()
+        # Следующее сообщение заводит новый обработчик
+        assert await actors.call("a", ok) == "ок"
+        assert actors._mailboxes["a"].task is not task
+
+    loop.run_until_complete(check())
+
+
+def test_dead_consumer_releases_waiters(loop):
+    actors = GameActors()
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.Event().wait()
+
+    async def ok():
+        return "ок"
+
+    async def check():
+        running = asyncio.ensure_future(actors.call("a", hang))
+        queued = asyncio.ensure_future(actors.call("a", ok))
+        await started.wait()
+        actors._mailboxes["a"].task.cancel()
+        results = await asyncio.gather(running, queued, return_exceptions=True)
+        assert [type(result) for result in results] == [asyncio.CancelledError] * 2
+        assert len(actors) == 0
+        assert await actors.call("a", ok) == "ок"
+
+    loop.run_until_complete(check())
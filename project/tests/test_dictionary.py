@@ -0,0 +1,88 @@
+from dictionary import CityDictionary, CityPool, MappedCityDictionary, normalize, write_compiled
+
+CITIES = [
+    "Москва", "Мурманск", "Майкоп", "Магадан", "Абакан", "Анапа", "Артём",
+    "Нальчик", "Нижний Новгород", "Комсомольск-на-Амуре", "Курск", "Казань",
+]
+SCORES = {"москва": 10.0, "казань": 5.0, "курск": 1.0, "анапа": 2.0}
+
+
+def test_compiled_dictionary_round_trips(tmp_path):
+    source = CityDictionary(CITIES, SCORES)
+    path = str(tmp_path / "cities.bin")
+    write_compiled(source, path)
+    mapped = MappedCityDictionary(path)
+
+    assert len(mapped) == len(source)
+    assert mapped.fingerprint == source.fingerprint
+    for idx, name in enumerate(source.names):
+        assert mapped.name(idx) == name
+        assert mapped.key(idx) == normalize(name)
+        assert mapped.resolve(name) == (idx, name)
+
+    # Поиск не зависит от регистра, ё и разделителей
+    assert mapped.resolve("артем") == source.resolve("артем")
+    assert mapped.resolve("артем")[1] == "Артём"
+    assert mapped.resolve("нижний-новгород")[1] == "Нижний Новгород"
+    assert mapped.resolve("КОМСОМОЛЬСК НА АМУРЕ")[1] == "Комсомольск-на-Амуре"
+    assert mapped.resolve("Атлантида") is None
+
+    for letter in source.by_letter:
+        assert list(mapped.letter_ids(letter)) == source.by_letter[letter]
+        assert list(mapped.ranked_ids(letter)) == source.ranked[letter]
+    assert [mapped.name(idx) for idx in mapped.ranked_ids("к")][:2] == ["Казань", "Курск"]
+    assert list(mapped.letter_ids("я")) == []
+
+    assert mapped.name_model().to_bytes() == source.name_model().to_bytes()
+
+
+def test_pool_dump_and_restore():
+    dictionary = CityDictionary(CITIES, SCORES)
+    pool = CityPool(dictionary)
+    for city in ("Москва", "Абакан", "Курск", "Атлантида"):
+        pool.take(city)
+    used, extra = pool.dump()
+    # Сохраняются разности соседних id, первая - от нуля
+    ids = sorted(dictionary.lookup(city) for city in ("Москва", "Абакан", "Курск"))
+    assert used == [ids[0], ids[1] - ids[0], ids[2] - ids[1]]
+    assert extra == ["атлантида"]
+
+    restored = CityPool.restore(dictionary, used, extra)
+    assert restored.used == pool.used
+    assert restored.is_used("москва") and restored.is_used("Атлантида")
+    assert not restored.is_used("Казань")
+    assert len(restored) == 4
+
+    assert CityPool(dictionary).dump() == ([], [])
+    assert CityPool.restore(dictionary, [], []).extra is None
+
+
+def test_pool_restores_legacy_hex_records():
+    dictionary = CityDictionary(CITIES, SCORES)
+    pool = CityPool(dictionary)
+    pool.take("Нальчик")
+    pool.take("Майкоп")
+    # Старый формат: битовое множество шестнадцатеричной строкой
+    restored = CityPool.restore(dictionary, format(pool.used, "x"), [])
+    assert restored.used == pool.used
+    assert CityPool.restore(dictionary, "0", []).used == 0
+
+
+def test_hints_follow_ranking_and_skip_named_cities():
+    dictionary = CityDictionary(CITIES, SCORES)
+    pool = CityPool(dictionary)
+
+    def names(ids):
+        return [dictionary.name(idx) for idx in ids]
+
+    assert names(pool.hint_ids("к", 2)) == ["Казань", "Курск"]
+
+    pool.take("Казань")
+    assert names(pool.hint_ids("К", 2)) == ["Курск", "Комсомольск-на-Амуре"]
+    assert pool.remaining("к") == 2
+
+    pool.take("Курск")
+    pool.take("Комсомольск-на-Амуре")
+    assert pool.hint_ids("к", 2) == []
+    assert pool.remaining("к") == 0
+    assert pool.pick("к") is None
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+from flood import FloodControl
+
+
+class FakeMessage:
+    """Входящее сообщение: FloodControl смотрит только на автора и answer()"""
+
+    def __init__(self, user_id: int, text: str):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.answers: List[str] = []
+
+    async def answer(self, text: str):
+        self.answers.append(text)
+
+
+def test_burst_then_drop_with_one_warning(loop):
+    flood = FloodControl(rate=20, burst=3)
+    handled = []
+
+    async def handler(message, data):
+        handled.append(message.text)
+
+    async def check():
+        messages = [FakeMessage(1, str(i)) for i in range(5)]
+        for message in messages:
+            await flood(handler, message, {})
+        assert handled == ["0", "1", "2"]
+        # О лимите пользователь узнает один раз, а не на каждое сообщение
+        assert [len(message.answers) for message in messages] == [0, 0, 0, 1, 0]
+        assert flood.stats == {"dropped": 2, "merged": 0}
+
+        # У другого пользователя свое ведро
+        await flood(handler, FakeMessage(2, "чужое"), {})
+        assert handled[-1] == "чужое"
+
+    loop.run_until_complete(check())
+
+
+def test_bucket_refills_over_time(loop):
+    flood = FloodControl(rate=20, burst=1)
+    handled = []
+
+    async def handler(message, data):
+        handled.append(message.text)
+
+    async def check():
+        await flood(handler, FakeMessage(1, "первое"), {})
+        await flood(handler, FakeMessage(1, "рано"), {})
+        await asyncio.sleep(0.06)
+        await flood(handler, FakeMessage(1, "после паузы"), {})
+        assert handled == ["первое", "после паузы"]
+        # Предупреждение сбрасывается после пропущенного сообщения
+        again = FakeMessage(1, "снова рано")
+        await flood(handler, again, {})
+        assert len(again.answers) == 1
+        assert flood.stats["dropped"] == 2
+
+    loop.run_until_complete(check())
+
+
+def test_busy_user_keeps_only_latest_message(loop):
+    interrupted = []
+    flood = FloodControl(rate=100, burst=10, interrupt=lambda message: interrupted.append(message.text))
+    handled = []
+    release = asyncio.Event()
+
+    async def handler(message, data):
+        handled.append(message.text)
+        if message.text == "медленный ход":
+            await release.wait()
+        return message.text
+
+    async def check():
+        slow = asyncio.ensure_future(flood(handler, FakeMessage(1, "медленный ход"), {}))
+        await asyncio.sleep(0)
+        waiting = []
+        for text in ("2", "3", "4"):
+            waiting.append(asyncio.ensure_future(flood(handler, FakeMessage(1, text), {})))
+            await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(slow, *waiting)
+        assert results == ["медленный ход", None, None, "4"]
+        assert handled == ["медленный ход", "4"]
+        assert interrupted == ["2", "3", "4"]
+        assert flood.stats == {"dropped": 0, "merged": 2}
+
+        # Очередь освободилась: следующее сообщение обрабатывается сразу
+        assert await flood(handler, FakeMessage(1, "5"), {}) == "5"
+
+    loop.run_until_complete(check())
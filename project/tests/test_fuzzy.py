@@ -0,0 +1,79 @@
+import os
+import random
+import time
+
+import pytest
+
+import fuzzy
+from dictionary import CityDictionary, CityPool, read_city_names
+
+CITIES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cities.txt")
+LETTERS = "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+@pytest.fixture(scope="module")
+def real_index():
+    return fuzzy.FuzzyIndex(CityDictionary(read_city_names(CITIES_FILE)))
+
+
+@pytest.fixture(scope="module")
+def large_index(real_index):
+    """100 тысяч случайных названий поверх настоящих городов"""
+    rng = random.Random(1)
+    names = {
+        rng.choice(LETTERS).upper() + "".join(rng.choice(LETTERS) for _ in range(rng.randint(4, 10)))
+        for _ in range(100000)
+    }
+    real = [real_index.dictionary.name(idx) for idx in range(len(real_index.dictionary))]
+    return fuzzy.FuzzyIndex(CityDictionary(sorted(names) + real))
+
+
+def test_suggests_close_names_on_the_letter(real_index):
+    assert real_index.suggest("Новосибирс", "н")[0] == "Новосибирск"
+    assert real_index.suggest("Екатеринбур", "е")[0] == "Екатеринбург"
+    assert real_index.suggest("самора", "С")[0] == "Самара"
+    # Нужная буква важнее похожести
+    assert real_index.suggest("Новосибирс", "м") == []
+
+
+def test_short_names_allow_one_typo(real_index):
+    assert "Уфа" in real_index.suggest("Уфо", "у")
+    assert real_index.suggest("Ууо", "у") == []
+
+
+def test_used_cities_are_not_suggested(real_index):
+    pool = CityPool(real_index.dictionary)
+    pool.take("Новосибирск")
+    assert "Новосибирск" not in real_index.suggest("Новосибирс", "н", pool)
+
+
+def test_large_dictionary_keeps_quality(large_index):
+    assert large_index.suggest("Навосибирск", "н")[0] == "Новосибирск"
+    assert large_index.suggest("Краснояск", "к")[0] == "Красноярск"
+
+
+def test_large_dictionary_work_is_bounded(large_index, monkeypatch):
+    checks = []
+    distance = fuzzy._distance
+
+    def counted(pattern, length, text):
+        checks.append(text)
+        return distance(pattern, length, text)
+
+    monkeypatch.setattr(fuzzy, "_distance", counted)
+    rng = random.Random(2)
+    timings = []
+    for _ in range(200):
+        idx = rng.randrange(len(large_index.dictionary))
+        name = large_index.dictionary.key(idx)
+        pos = rng.randrange(1, len(name))
+        query = name[:pos] + rng.choice(LETTERS) + name[pos + 1:]
+        checks.clear()
+        started = time.perf_counter()
+        suggestions = large_index.suggest(query, name[0])
+        timings.append(time.perf_counter() - started)
+        assert len(checks) <= fuzzy.MAX_CANDIDATES
+        assert large_index.dictionary.name(idx) in suggestions or len(suggestions) == 3
+    timings.sort()
+    # Запас в несколько раз: на машине разработчика p50 около 0.1 мс
+    assert timings[len(timings) // 2] < 0.001
@@ -0,0 +1,43 @@
+import random
+
+from markov import NameModel, _split
+
+CITIES = ["Москва", "Мурманск", "Майкоп", "Магадан", "Абакан", "Анапа", "Нальчик", "Курск", "Казань"]
+
+
+def test_model_round_trips_through_bytes():
+    model = NameModel.train(CITIES)
+    restored = NameModel.from_bytes(model.to_bytes())
+    assert restored.table == model.table
+    # Сериализация детерминирована: скомпилированный словарь не меняется от сборки к сборке
+    assert NameModel.train(reversed(CITIES)).to_bytes() == model.to_bytes()
+
+
+def test_single_name_is_reproduced_with_capitalization():
+    model = NameModel.train(["Комсомольск-на-Амуре"])
+    assert model.generate("к") == "Комсомольск-на-Амуре"
+    assert model.generate("К") == "Комсомольск-на-Амуре"
+
+
+def test_generated_names_start_with_letter():
+    model = NameModel.train(CITIES)
+    random.seed(7)
+    alphabet = set("".join(CITIES).lower())
+    for letter in ("м", "а", "к", "н"):
+        for _ in range(20):
+            name = model.generate(letter)
+            assert name[0] == letter.upper()
+            assert set(name.lower()) <= alphabet
+    # На букву без городов цепь переходит к коротким контекстам
+    assert model.generate("я").startswith("Я")
+
+
+def test_endless_chain_gives_up():
+    model = NameModel({"": ("а", [1])})
+    assert model.generate("б") == ""
+
+
+def test_split_keeps_separators():
+    assert _split("ростов-на-дону") == ["ростов-", "на-", "дону"]
+    assert _split("нижний новгород") == ["нижний ", "новгород"]
+    assert _split("омск") == ["омск"]
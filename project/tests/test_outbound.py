@@ -0,0 +1,128 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from load_test import FakeSession
+from outbound import PRIORITY_SUMMARY, OutboundScheduler, priority
+
+
+class RecordingSession(FakeSession):
+    """Фейковый Bot API нагрузочного теста, который помнит время отправок
+
+    retry_after[chat_id] - сколько раз подряд ответить на отправку в чат
+    ошибкой 429 и с какой паузой.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent: List[Tuple[float, int, str]] = []
+        self.attempts: List[Tuple[float, int]] = []
+        self.retry_after: Dict[int, Tuple[int, int]] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        now = asyncio.get_running_loop().time()
+        self.attempts.append((now, method.chat_id))
+        times, seconds = self.retry_after.get(method.chat_id, (0, 0))
+        if times:
+            self.retry_after[method.chat_id] = (times - 1, seconds)
+            raise TelegramRetryAfter(method, "Too Many Requests", seconds)
+        self.sent.append((now, method.chat_id, method.text))
+        return await super().make_request(bot, method, timeout)
+
+
+@pytest.fixture
+def telegram(loop):
+    """Фабрика бота, отправляющего через OutboundScheduler с заданными лимитами"""
+    runners = []
+
+    def make(**limits) -> Tuple[Bot, RecordingSession]:
+        session = RecordingSession()
+        scheduler = OutboundScheduler(**limits)
+        session.middleware(scheduler)
+        runners.append(loop.create_task(scheduler.run()))
+        return Bot("42:TEST", session=session), session
+
+    yield make
+    for runner in runners:
+        runner.cancel()
+    loop.run_until_complete(asyncio.gather(*runners, return_exceptions=True))
+
+
+def test_global_rate_limits_all_chats(loop, telegram):
+    bot, session = telegram(rate=10, chat_rate=100, chat_burst=100)
+
+    async def check():
+        start = loop.time()
+        await asyncio.gather(*(bot.send_message(chat_id, "ход") for chat_id in range(1, 16)))
+        times = sorted(sent - start for sent, _, _ in session.sent)
+        # Запас ведра уходит сразу, остальные 5 сообщений - по 10 в секунду
+        assert times[9] < 0.1
+        assert times[-1] >= 0.45
+
+    loop.run_until_complete(check())
+
+
+def test_chat_burst_then_chat_rate_in_order(loop, telegram):
+    bot, session = telegram(rate=1000, chat_rate=10, chat_burst=3)
+
+    async def check():
+        start = loop.time()
+        await asyncio.gather(*(bot.send_message(7, str(i)) for i in range(5)))
+        assert [text for _, _, text in session.sent] == ["0", "1", "2", "3", "4"]
+        times = [sent - start for sent, _, _ in session.sent]
+        assert times[2] < 0.05
+        assert times[3] >= 0.09
+        assert times[4] >= 0.19
+
+    loop.run_until_complete(check())
+
+
+def test_game_replies_overtake_summaries(loop, telegram):
+    bot, session = telegram(rate=10, chat_rate=100, chat_burst=100)
+
+    async def summary(chat_id):
+        with priority(PRIORITY_SUMMARY):
+            await bot.send_message(chat_id, "итоги")
+
+    async def check():
+        # Запас общего лимита исчерпан, дальше все ждут раздачи в run()
+        await asyncio.gather(*(bot.send_message(chat_id, "ход") for chat_id in range(1, 11)))
+        await asyncio.gather(
+            *(summary(chat_id) for chat_id in range(10, 13)),
+            *(bot.send_message(chat_id, "ход") for chat_id in range(20, 23))
+        )
+        queued = [text for _, _, text in session.sent[10:]]
+        assert queued == ["ход"] * 3 + ["итоги"] * 3
+
+    loop.run_until_complete(check())
+
+
+def test_retry_after_pauses_chat_and_repeats(loop, telegram):
+    bot, session = telegram(rate=1000, chat_rate=100, chat_burst=100)
+    session.retry_after[7] = (1, 1)
+
+    async def check():
+        start = loop.time()
+        message, _ = await asyncio.gather(bot.send_message(7, "ход"), bot.send_message(8, "ход"))
+        assert message.text == "ход"
+        attempts = [sent - start for sent, chat_id in session.attempts if chat_id == 7]
+        assert len(attempts) == 2
+        assert attempts[1] - attempts[0] >= 0.95
+        # Пауза касается только чата, получившего 429
+        assert [sent - start for sent, chat_id, _ in session.sent if chat_id == 8][0] < 0.1
+        assert session.inboxes[7].drain() == [("ход", False)]
+
+    loop.run_until_complete(check())
+
+
+def test_retry_after_gives_up_after_max_retries(loop, telegram):
+    bot, session = telegram(rate=1000, chat_rate=100, chat_burst=100, max_retries=2)
+    session.retry_after[7] = (10, 0)
+
+    with pytest.raises(TelegramRetryAfter):
+        loop.run_until_complete(bot.send_message(7, "ход"))
+    assert len(session.attempts) == 3
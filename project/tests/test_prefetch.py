@@ -0,0 +1,77 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from prefetch import Prefetcher
+from wiki_cache import WikiCache
+
+
+class SlowWiki:
+    """Википедия, которая отвечает, только когда ее отпустят"""
+
+    def __init__(self):
+        self.started: List[str] = []
+        self.cancelled: List[str] = []
+        self.release = asyncio.Event()
+
+    async def fetch(self, city: str) -> Optional[str]:
+        self.started.append(city)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(city)
+            raise
+        return f"{city} - город."
+
+
+@pytest.fixture
+def wiki(tmp_path):
+    slow = SlowWiki()
+    cache = WikiCache(slow.fetch, str(tmp_path / "wiki.sqlite3"))
+    yield slow, cache
+    cache.close()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_prefetch_stops_the_fetch(wiki):
+    slow, cache = wiki
+
+    async def run():
+        prefetcher = Prefetcher(cache.get)
+        prefetcher.schedule("game", "Казань")
+        await _settle()
+        prefetcher.cancel("game")
+        await _settle()
+        assert slow.cancelled == ["Казань"]
+        # Отмененная загрузка не попала в кеш: следующий запрос идет в сеть
+        slow.release.set()
+        assert await cache.get("Казань") == "Казань - город."
+        assert slow.started == ["Казань", "Казань"]
+
+    asyncio.run(run())
+
+
+def test_prefetch_cancel_keeps_fetch_a_player_waits_for(wiki):
+    slow, cache = wiki
+
+    async def run():
+        prefetcher = Prefetcher(cache.get)
+        prefetcher.schedule("game", "Казань")
+        await _settle()
+        player = asyncio.create_task(cache.get("Казань"))
+        await _settle()
+        prefetcher.cancel("game")
+        await _settle()
+        slow.release.set()
+        assert await player == "Казань - город."
+        assert slow.cancelled == []
+        assert await cache.get("Казань") == "Казань - город."
+        assert slow.started == ["Казань"]
+
+    asyncio.run(run())
+    assert cache.stats == {"hits": 1, "disk_hits": 0, "misses": 1, "joined": 1}
@@ -0,0 +1,59 @@
+import asyncio
+
+from registry import SEQUENCE_KEY, GameRegistry, _base36
+from sessions import MemorySessionStore
+
+
+def test_base36():
+    assert [_base36(n) for n in (0, 9, 10, 35, 36, 1295, 1296)] == ["0", "9", "a", "z", "10", "zz", "100"]
+
+
+def test_workers_get_disjoint_id_blocks(loop):
+    store = MemorySessionStore()
+    first, second = GameRegistry(store, block=10), GameRegistry(store, block=10)
+
+    async def check():
+        ids = await asyncio.gather(*(first.new_id() for _ in range(15)), *(second.new_id() for _ in range(15)))
+        assert len(set(ids)) == 30
+        # Первый блок не начинается с нуля: "0" не выдается
+        assert sorted(int(game_id, 36) for game_id in ids[:15])[0] == 1
+        # Блоки берутся из общего счетчика: 4 блока по 10
+        assert (await store.load(SEQUENCE_KEY))[0] == {"next": 41}
+
+        # Перезапуск продолжает счетчик, а не начинает заново
+        restarted = GameRegistry(store, block=10)
+        assert await restarted.new_id() == _base36(41)
+
+    loop.run_until_complete(check())
+
+
+def test_invites_expire_in_creation_order():
+    registry = GameRegistry(MemorySessionStore(), invite_ttl=60)
+    registry.add_pending("a", 1, 2, created=100.0)
+    registry.add_pending("b", 3, 4, created=130.0)
+    registry.add_pending("c", 5, 6, created=150.0)
+    assert registry.game_of(1) == "a"
+    assert registry.game_of(2) is None  # Приглашенный попадает в индекс, только приняв игру
+
+    assert registry.expired_invites(now=159.0) == []
+    assert registry.expired_invites(now=160.0) == ["a"]
+    assert registry.expired_invites(now=195.0) == ["a", "b"]
+
+    # Принятое приглашение больше не истекает
+    registry.start("b")
+    assert registry.game_of(4) == "b"
+    assert registry.expired_invites(now=300.0) == ["a", "c"]
+
+    registry.remove("a")
+    assert registry.game_of(1) is None
+    assert registry.expired_invites(now=300.0) == ["c"]
+
+
+def test_remove_keeps_players_newer_game():
+    registry = GameRegistry(MemorySessionStore())
+    registry.add_started("old", 1, 2)
+    registry.add_started("new", 1, 3)
+    registry.remove("old")
+    assert registry.game_of(1) == "new"
+    assert registry.game_of(2) is None
+    assert registry.game_of(3) == "new"
@@ -0,0 +1,213 @@
+import asyncio
+import fnmatch
+from typing import Dict, List, Optional
+
+import pytest
+
+import sessions
+from sessions import NEW, MemorySessionStore, RedisError, RedisSessionStore
+
+
+class RespStandIn:
+    """Локальный сервер с протоколом RESP: подмножество Redis, которое использует бот
+
+    Скрипты EVAL не интерпретируются: сервер узнает два скрипта хранилища
+    и выполняет ту же логику на Python, атомарно в рамках одного запроса.
+    """
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.connections = 0
+        self.commands: List[bytes] = []
+        self.url = ""
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        self.url = f"redis://{auth}127.0.0.1:{port}/0"
+        return self.url
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        authenticated = self.password is None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                name = args[0].upper()
+                self.commands.append(name)
+                if name == b"AUTH":
+                    authenticated = args[1].decode() == self.password
+                    reply = b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n"
+                elif not authenticated:
+                    reply = b"-NOAUTH Authentication required\r\n"
+                else:
+                    reply = self._execute(name, args[1:])
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            # Клиент закрыл соединение или цикл событий останавливается
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> List[bytes]:
+        count = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, name: bytes, args: List[bytes]) -> bytes:
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"HMGET":
+            fields = self.hashes.get(args[0], {})
+            return _array([fields.get(field) for field in args[1:]])
+        if name == b"SCAN":
+            pattern = args[args.index(b"MATCH") + 1].decode()
+            keys = [key for key in self.hashes if fnmatch.fnmatchcase(key.decode(), pattern)]
+            return b"*2\r\n" + _bulk(b"0") + _array(keys)
+        if name == b"EVAL":
+            script, key, argv = args[0].decode(), args[2], args[3:]
+            if script == sessions._SAVE_SCRIPT:
+                current = self.hashes.get(key)
+                version = int(current[b"v"]) if current else 0
+                if version != int(argv[0]):
+                    return b":0\r\n"
+                self.hashes[key] = {b"v": str(version + 1).encode(), b"d": argv[1]}
+                return b":1\r\n"
+            if script == sessions._DELETE_SCRIPT:
+                current = self.hashes.get(key)
+                if current is None or (argv[0] and int(current[b"v"]) != int(argv[0])):
+                    return b":0\r\n"
+                del self.hashes[key]
+                return b":1\r\n"
+            return b"-ERR unknown script\r\n"
+        return b"-ERR unknown command '" + name + b"'\r\n"
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+
+def _array(values: List[Optional[bytes]]) -> bytes:
+    return b"*" + str(len(values)).encode() + b"\r\n" + b"".join(_bulk(value) for value in values)
+
+
+@pytest.fixture
+def resp_server(loop, request):
+    """RESP-сервер на цикле теста; пароль задается через parametrize(indirect=True)"""
+    server = RespStandIn(getattr(request, "param", None))
+    loop.run_until_complete(server.start())
+    yield server
+    loop.run_until_complete(server.stop())
+
+
+@pytest.fixture
+def store(loop, resp_server):
+    store = RedisSessionStore(resp_server.url, pool_size=4)
+    yield store
+    loop.run_until_complete(store.close())
+
+
+async def _compare_and_set(store):
+    assert await store.load("session:1") == (None, NEW)
+    assert await store.save("session:1", {"score": 1}, NEW)
+    record, version = await store.load("session:1")
+    assert record == {"score": 1} and version == 1
+
+    # Второй воркер прочитал ту же версию, но опоздал с записью
+    assert await store.save("session:1", {"score": 2}, version)
+    assert not await store.save("session:1", {"score": 3}, version)
+    assert await store.load("session:1") == ({"score": 2}, 2)
+
+    # Создание не перезаписывает существующую запись
+    assert not await store.save("session:1", {"score": 4}, NEW)
+
+    assert not await store.delete("session:1", 1)
+    assert await store.delete("session:1", 2)
+    assert not await store.delete("session:1")
+    assert await store.load("session:1") == (None, NEW)
+
+
+def test_memory_store_compare_and_set():
+    asyncio.run(_compare_and_set(MemorySessionStore()))
+
+
+def test_redis_store_compare_and_set(loop, store):
+    loop.run_until_complete(_compare_and_set(store))
+
+
+def test_redis_store_records_are_json_in_prefixed_hashes(loop, store, resp_server):
+    async def check():
+        await store.put("game:a1", ["single", 7, "ff", [], "Москва", None])
+        assert list(resp_server.hashes) == [b"cities:game:a1"]
+        assert resp_server.hashes[b"cities:game:a1"][b"d"] == '["single",7,"ff",[],"Москва",null]'.encode()
+        assert await store.load("game:a1") == (["single", 7, "ff", [], "Москва", None], 1)
+
+    loop.run_until_complete(check())
+
+
+def test_redis_store_concurrent_saves_only_one_wins(loop, store):
+    async def check():
+        await store.put("game:x", {"turn": 0})
+        _, version = await store.load("game:x")
+        results = await asyncio.gather(*(store.save("game:x", {"turn": i}, version) for i in range(8)))
+        assert results.count(True) == 1
+
+    loop.run_until_complete(check())
+
+
+def test_redis_store_reuses_pooled_connections(loop, store, resp_server):
+    async def check():
+        for i in range(50):
+            await store.put(f"session:{i}", {"i": i})
+        assert resp_server.connections == 1
+        await asyncio.gather(*(store.load(f"session:{i}") for i in range(50)))
+        assert resp_server.connections <= 4
+
+    loop.run_until_complete(check())
+
+
+def test_redis_store_keys_strip_prefix(loop, store, resp_server):
+    async def check():
+        resp_server.hashes[b"other:session:9"] = {b"v": b"1", b"d": b"{}"}
+        for key in ("session:1", "game:b2", "fsm:1:1:1:0:default"):
+            await store.put(key, {})
+        assert sorted(await store.keys()) == ["fsm:1:1:1:0:default", "game:b2", "session:1"]
+
+    loop.run_until_complete(check())
+
+
+@pytest.mark.parametrize("resp_server", ["secret"], indirect=True)
+def test_redis_store_authenticates(loop, store, resp_server):
+    async def check():
+        await store.put("session:1", {})
+        assert resp_server.commands[:2] == [b"AUTH", b"HMGET"]
+
+    loop.run_until_complete(check())
+
+
+def test_redis_store_surfaces_server_errors_and_keeps_connection(loop, store, resp_server):
+    async def check():
+        try:
+            await store.command("FLUSHALL")
+        except RedisError as e:
+            assert "unknown command" in str(e)
+        else:
+            raise AssertionError("ошибка сервера не дошла до вызывающего")
+        await store.put("session:1", {})
+        assert resp_server.connections == 1
+
+    loop.run_until_complete(check())
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Hashable, List, Optional
+
+import pytest
+from aiogram.types import Chat, Message, Update, User
+
+from dictionary import CityDictionary, CityPool, MappedCityDictionary, write_compiled
+from load_test import FakeSession
+
+# На каждую последнюю букву есть хотя бы два города: бот всегда ищет ответ
+CITIES = [
+    "Абакан", "Анапа", "Ачинск", "Нальчик", "Новгород", "Курск",
+    "Казань", "Калуга", "Кострома", "Дудинка", "Донецк", "Дзержинск"
+]
+
+
+class SlowSearch:
+    """Пул поиска ходов, который ищет, пока его не отменят"""
+
+    def __init__(self):
+        self.events: List[str] = []
+        self.started = asyncio.Event()
+        self._future: Optional[asyncio.Future] = None
+
+    async def choose(self, pool: CityPool, letter: str, game_key: Hashable) -> Optional[str]:
+        self.events.append("search start")
+        self._future = asyncio.get_running_loop().create_future()
+        self.started.set()
+        try:
+            await asyncio.wait_for(self._future, 5)
+        except asyncio.CancelledError:
+            self.events.append("search cancelled")
+            return None
+        except asyncio.TimeoutError:
+            self.events.append("search done")
+        return pool.pick(letter)
+
+    def cancel(self, game_key: Hashable):
+        # Отмена после конца поиска ничего не меняет: ее не записываем
+        if self._future is not None and not self._future.done():
+            self.events.append("cancel")
+            self._future.cancel()
+
+
+@pytest.fixture
+def single_bot(bot_module, tmp_path, monkeypatch):
+    """Бот с фейковым Bot API и скомпилированным словарем, как в проде"""
+    path = str(tmp_path / "cities.bin")
+    write_compiled(CityDictionary(CITIES), path)
+    dictionary = MappedCityDictionary(path)
+    bot_module.register_dictionary(dictionary)
+    session = FakeSession()
+    search = SlowSearch()
+    monkeypatch.setattr(bot_module, "CITIES", dictionary)
+    monkeypatch.setattr(bot_module.bot, "session", session)
+    monkeypatch.setattr(bot_module, "search_pool", search)
+    monkeypatch.setattr(bot_module, "PREFETCH_ENABLED", False)
+    return bot_module, session, search
+
+
+def _updates(user_id: int):
+    ids = itertools.count(1)
+
+    def update(text: str) -> Update:
+        return Update(
+            update_id=next(ids),
+            message=Message(
+                message_id=next(ids),
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=User(id=user_id, is_bot=False, first_name="Игрок"),
+                text=text
+            )
+        )
+
+    return update
+
+
+def test_surrender_cancels_search_in_progress(single_bot):
+    bot_module, session, search = single_bot
+    user_id = 501
+    update = _updates(user_id)
+
+    async def run():
+        feed = bot_module.dp.feed_update
+        for text in ("/start", "🎮 Одиночная игра", bot_module.DIFFICULTIES["hard"]["name"]):
+            await feed(bot_module.bot, update(text))
+        game, _ = await bot_module.load_single_game(user_id)
+        letter = bot_module.get_last_letter(game.last)
+        move = next(city for city in CITIES if city[0].lower() == letter and not game.pool.is_used(city))
+
+        turn = asyncio.create_task(feed(bot_module.bot, update(move)))
+        await asyncio.wait_for(search.started.wait(), 1)
+        surrender = asyncio.create_task(feed(bot_module.bot, update("🏳 Сдаться")))
+        await asyncio.wait_for(asyncio.gather(turn, surrender), 2)
+        state = bot_module.dp.fsm.get_context(bot_module.bot, chat_id=user_id, user_id=user_id)
+        return await state.get_state()
+
+    state = asyncio.run(run())
+    # Отмена пришла, пока поиск еще шел, а не после него
+    assert search.events == ["search start", "cancel", "search cancelled"]
+    texts = [text for text, _ in session.inboxes[user_id].drain()]
+    assert "Игра окончена! Вы сдались" in texts[-1]
+    assert not any("Мой город" in text for text in texts[3:])
+    assert state == bot_module.GameState.MAIN_MENU.state
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Tuple
+
+from dictionary import CityPool
+from games import MultiGame, SingleGame
+from registry import GameRegistry
+from sessions import NEW
+from snapshots import SnapshotSessionStore
+
+
+def _restored(directory: str) -> SnapshotSessionStore:
+    store = SnapshotSessionStore(directory)
+    store.restore()
+    return store
+
+
+async def _abandon(store: SnapshotSessionStore):
+    """Падение бота: журнал дописан, но снимка при остановке нет"""
+    await store.flush()
+    store._journal.close()
+
+
+def test_snapshot_then_journal_round_trip(tmp_path):
+    directory = str(tmp_path / "state")
+
+    async def first_run():
+        store = _restored(directory)
+        await store.put("session:1", {"turn": 1})
+        await store.put("session:2", {"turn": 2})
+        await store.put("fsm:1", {"state": "menu"})
+        await store.snapshot()
+        # После снимка - только журнал
+        _, version = await store.load("session:1")
+        assert await store.save("session:1", {"turn": 3}, version)
+        assert await store.delete("session:2")
+        await store.put("game:a1", ["m", 1, [], [], None, None])
+        await _abandon(store)
+        return dict(store.records)
+
+    records = asyncio.run(first_run())
+    store = _restored(directory)
+    assert store.records == records
+    # Журнал до снимка уже в снимке и удален
+    assert "journal.1.bin" not in os.listdir(directory)
+
+    async def second_run():
+        # Версии пережили перезапуск: устаревшая запись не пройдет
+        record, version = await store.load("session:1")
+        assert record == {"turn": 3}
+        assert not await store.save("session:1", {"turn": 0}, version - 1)
+        assert await store.save("session:1", {"turn": 4}, version)
+        await store.close()
+
+    asyncio.run(second_run())
+    store = _restored(directory)
+    assert asyncio.run(store.load("session:1"))[0] == {"turn": 4}
+    assert asyncio.run(store.load("session:2")) == (None, NEW)
+
+
+def test_torn_journal_tail_is_dropped(tmp_path):
+    directory = str(tmp_path / "state")
+
+    async def run():
+        store = _restored(directory)
+        await store.put("session:1", {"turn": 1})
+        await store.put("session:2", {"turn": 2})
+        await _abandon(store)
+
+    asyncio.run(run())
+    journal = os.path.join(directory, "journal.1.bin")
+    with open(journal, "r+b") as f:
+        f.truncate(os.path.getsize(journal) - 3)
+    store = _restored(directory)
+    assert list(store.records) == ["session:1"]
+
+
+def test_store_without_restore_keeps_no_journal(tmp_path):
+    directory = str(tmp_path / "state")
+
+    async def run():
+        store = SnapshotSessionStore(directory)
+        for i in range(100):
+            await store.put(f"session:{i}", {"turn": i})
+        await store.flush()
+        assert store._buffer == []
+
+    asyncio.run(run())
+    assert os.listdir(directory) == []
+
+
+class Timers:
+    def __init__(self):
+        self.scheduled: Dict[Tuple[str, object], float] = {}
+
+    def schedule_many(self, items):
+        self.scheduled.update(items)
+
+
+def test_restore_games_rearms_timers_and_invites(bot_module, tmp_path, monkeypatch):
+    directory = str(tmp_path / "state")
+    dictionary = bot_module.CITIES
+
+    async def first_run():
+        store = _restored(directory)
+        single = SingleGame(CityPool(dictionary), "easy")
+        single.play(dictionary.random_city())
+        single.set_timer(30)
+        await store.put("session:11", single.to_record())
+        invite = MultiGame(CityPool(dictionary), 21, 22)
+        await store.put("game:g1", invite.to_record())
+        await store.put("session:21", {"game": "g1"})
+        started = MultiGame(CityPool(dictionary), 31, 32)
+        started.started = True
+        started.set_timer(120)
+        await store.put("game:g2", started.to_record())
+        await store.put("fsm:11:11:11:0:default", {"state": "GameState:PLAYING_SINGLE"})
+        await _abandon(store)
+
+    asyncio.run(first_run())
+    store = SnapshotSessionStore(directory)
+    registry = GameRegistry(store)
+    timers = Timers()
+    monkeypatch.setattr(bot_module, "session_store", store)
+    monkeypatch.setattr(bot_module, "registry", registry)
+    monkeypatch.setattr(bot_module, "deadlines", timers)
+
+    asyncio.run(bot_module.restore_games())
+    assert sorted(timers.scheduled) == [("multi", "g2"), ("single", 11)]
+    assert 25 < timers.scheduled[("single", 11)] <= 30
+    assert 115 < timers.scheduled[("multi", "g2")] <= 120
+    assert registry.game_of(21) == "g1"
+    assert registry.expired_invites(time.monotonic() + registry.invite_ttl + 1) == ["g1"]
+    assert registry.game_of(31) == "g2"
@@ -0,0 +1,27 @@
+from dictionary import CityDictionary, CityPool
+from strategy import MoveEngine
+
+CITIES = ["Абакан", "Анапа", "Ачинск", "Нальчик", "Новгород", "Курск", "Казань", "Калуга", "Кострома"]
+
+
+def last_letter(city: str) -> str:
+    return city[-2].lower() if city[-1] in "ьыйъё" else city[-1].lower()
+
+
+def test_choose_falls_back_to_pick_until_graph_is_built():
+    engine = MoveEngine(last_letter)
+    pool = CityPool(CityDictionary(CITIES))
+    pool.take("Абакан")
+    assert engine.choose(pool, "а") in ("Анапа", "Ачинск")
+    # Граф строится только явно, вне хода
+    assert pool.dictionary not in engine._graphs
+
+
+def test_choose_avoids_moves_that_lose():
+    engine = MoveEngine(last_letter, budget=0.05)
+    pool = CityPool(CityDictionary(["Анапа", "Абакан", "Нальчик", "Курск"]))
+    engine.graph(pool.dictionary)
+    # После "Анапа" соперник отвечает "Абакан", и без хода в конце остается бот;
+    # после "Абакан" идут Нальчик и Курск, и ходить нечем сопернику
+    for _ in range(10):
+        assert engine.choose(pool, "а") == "Абакан"
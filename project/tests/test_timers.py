@@ -0,0 +1,58 @@
+import asyncio
+
+from timers import DeadlineScheduler
+
+
+def test_rescheduling_compacts_heap_and_fires_latest(loop):
+    fired = []
+
+    async def on_expire(key):
+        fired.append((key, loop.time()))
+
+    scheduler = DeadlineScheduler(on_expire)
+
+    async def check():
+        runner = asyncio.ensure_future(scheduler.run())
+        start = loop.time()
+        # Каждый ход переносит дедлайн: старые записи копятся в куче
+        for _ in range(1000):
+            scheduler.schedule("game", 0.05)
+            assert len(scheduler._heap) <= 2 * len(scheduler._current) + 64
+        for i in range(200):
+            scheduler.schedule(i, 10)
+            scheduler.cancel(i)
+        assert len(scheduler._heap) <= 2 * len(scheduler._current) + 64
+
+        await asyncio.sleep(0.15)
+        assert [key for key, _ in fired] == ["game"]
+        assert fired[0][1] - start >= 0.05
+        assert not scheduler._current
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    loop.run_until_complete(check())
+
+
+def test_schedule_many_compacts_and_fires_in_order(loop):
+    fired = []
+
+    async def on_expire(key):
+        fired.append(key)
+
+    scheduler = DeadlineScheduler(on_expire)
+
+    async def check():
+        runner = asyncio.ensure_future(scheduler.run())
+        # Повторное восстановление тех же игр оставляет в куче устаревшие записи
+        for _ in range(3):
+            scheduler.schedule_many((key, 10) for key in range(100))
+        assert len(scheduler._heap) == 100
+        scheduler.schedule_many((key, 0.01 * (3 - key)) for key in range(3))
+        assert len(scheduler._heap) == 103
+
+        await asyncio.sleep(0.1)
+        assert fired == [2, 1, 0]
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    loop.run_until_complete(check())
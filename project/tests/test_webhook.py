@@ -0,0 +1,111 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from load_test import FakeSession
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret"
+
+
+class Handled:
+    """Что дошло до обработчика; gate держит обработку, пока его не откроют"""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+
+@pytest.fixture
+def handled() -> Handled:
+    return Handled()
+
+
+@pytest.fixture
+def webhook(handled) -> WebhookServer:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: Message):
+        await handled.gate.wait()
+        handled.texts.append(message.text)
+
+    return WebhookServer(dp, Bot("42:TEST", session=FakeSession()), "/hook", SECRET, max_in_flight=2)
+
+
+def _update(update_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Игрок"},
+            "text": text
+        }
+    }
+
+
+async def _post(client: TestClient, body, secret: str = SECRET) -> int:
+    headers = {SECRET_HEADER: secret}
+    if isinstance(body, (bytes, str)):
+        response = await client.post("/hook", data=body, headers=headers)
+    else:
+        response = await client.post("/hook", json=body, headers=headers)
+    return response.status
+
+
+def test_webhook_rejects_wrong_secret(webhook, handled):
+    async def run():
+        async with TestClient(TestServer(webhook.app())) as client:
+            assert await _post(client, _update(1, "Москва"), "wrong") == 401
+            assert await _post(client, _update(2, "Москва"), "sékret") == 401
+            response = await client.post("/hook", json=_update(3, "Москва"))
+            assert response.status == 401
+
+    asyncio.run(run())
+    assert handled.texts == []
+
+
+def test_webhook_rejects_bad_body(webhook, handled):
+    async def run():
+        async with TestClient(TestServer(webhook.app())) as client:
+            assert await _post(client, b"{not json") == 400
+            assert await _post(client, [1]) == 400
+            assert await _post(client, "42") == 400
+
+    asyncio.run(run())
+    assert handled.texts == []
+
+
+def test_webhook_dispatches_update(webhook, handled):
+    async def run():
+        async with TestClient(TestServer(webhook.app())) as client:
+            assert await _post(client, _update(1, "Москва")) == 200
+        # Сервер дообрабатывает принятые обновления при остановке
+
+    asyncio.run(run())
+    assert handled.texts == ["Москва"]
+
+
+def test_webhook_bounds_updates_in_flight(webhook, handled):
+    async def run():
+        handled.gate.clear()
+        async with TestClient(TestServer(webhook.app())) as client:
+            assert await _post(client, _update(1, "Абакан")) == 200
+            assert await _post(client, _update(2, "Нальчик")) == 200
+            assert webhook.in_flight == 2
+            # Мест нет: третий ответ задерживается, пока не освободится слот
+            third = asyncio.create_task(_post(client, _update(3, "Калуга")))
+            await asyncio.sleep(0.1)
+            assert not third.done()
+            handled.gate.set()
+            assert await asyncio.wait_for(third, 1) == 200
+
+    asyncio.run(run())
+    assert sorted(handled.texts) == ["Абакан", "Калуга", "Нальчик"]
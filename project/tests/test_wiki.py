@@ -0,0 +1,77 @@
+import asyncio
+from typing import List, Set
+
+import pytest
+from aiohttp import web
+
+
+class WikiStandIn:
+    """Локальный сервер вместо API Википедии: отдает описание или 404
+
+    Запоминает порты клиентов: по ним видно, сколько соединений открыл бот.
+    """
+
+    def __init__(self, missing: Set[str]):
+        self.missing = missing
+        self.ports: List[int] = []
+        self._runner = None
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/summary/{title}", self._summary)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://127.0.0.1:{port}/summary/"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _summary(self, request: web.Request) -> web.Response:
+        self.ports.append(request.transport.get_extra_info("peername")[1])
+        title = request.match_info["title"]
+        if title in self.missing:
+            return web.json_response({"title": "Not found."}, status=404)
+        return web.json_response({"title": title, "extract": f"{title} - город."})
+
+
+@pytest.fixture
+def wiki(loop, bot_module, monkeypatch):
+    """Стенд Википедии, на который смотрит бот; страницы из wiki.missing отдают 404"""
+    server = WikiStandIn(set())
+    monkeypatch.setattr(bot_module, "WIKI_API_URL", loop.run_until_complete(server.start()))
+    yield server
+    # Сессия привязана к циклу событий теста
+    if bot_module.http_session is not None:
+        loop.run_until_complete(bot_module.http_session.close())
+        bot_module.http_session = None
+    loop.run_until_complete(server.stop())
+
+
+def test_wiki_requests_reuse_connections(loop, bot_module, wiki):
+    async def check():
+        for city in ("Казань", "Самара", "Омск", "Уфа", "Пермь"):
+            assert await bot_module.fetch_wiki_summary(city) == f"{city} - город."
+        assert len(wiki.ports) == 5
+        assert len(set(wiki.ports)) == 1
+
+        cities = [f"Город{i}" for i in range(50)]
+        await asyncio.gather(*(bot_module.fetch_wiki_summary(city) for city in cities))
+        assert len(set(wiki.ports)) <= bot_module.HTTP_POOL_SIZE
+
+    loop.run_until_complete(check())
+
+
+def test_wiki_missing_page(loop, bot_module, wiki):
+    wiki.missing.update({"Нейросбург", "Квантоград"})
+
+    async def check():
+        assert await bot_module.fetch_wiki_summary("Нейросбург") is None
+        assert await bot_module.get_wiki_info("Квантоград") == "Информация не найдена"
+        # Отрицательный ответ кешируется: второй раз в сеть не идем
+        assert await bot_module.get_wiki_info("Квантоград") == "Информация не найдена"
+        assert len(wiki.ports) == 2
+
+    loop.run_until_complete(check())
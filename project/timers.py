@@ -0,0 +1,95 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Таймауты игр на мин-куче: срабатывают точно в срок
+
+    Перенос дедлайна не ищет старую запись в куче, а просто добавляет
+    новую; устаревшие записи отбрасываются при извлечении.
+    """
+
+    def __init__(self, on_expire: Callable[[Hashable], Awaitable[None]]):
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._current: Dict[Hashable, int] = {}  # Ключ -> номер актуальной записи
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._firing: Set[asyncio.Task] = set()
+
+    def schedule(self, key: Hashable, delay: float):
+        """Ставим (или переносим) дедлайн через delay секунд"""
+        deadline = asyncio.get_running_loop().time() + delay
+        seq = next(self._counter)
+        self._current[key] = seq
+        if not self._heap or deadline < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._compact()
+
+    def schedule_many(self, items: Iterable[Tuple[Hashable, float]]):
+        """Ставим много дедлайнов (ключ, через сколько секунд) одной сборкой кучи"""
+        now = asyncio.get_running_loop().time()
+        for key, delay in items:
+            seq = next(self._counter)
+            self._current[key] = seq
+            self._heap.append((now + delay, seq, key))
+        heapq.heapify(self._heap)
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._compact()
+        self._wakeup.set()
+
+    def cancel(self, key: Hashable):
+        """Снимаем дедлайн; запись в куче станет устаревшей"""
+        self._current.pop(key, None)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._current.get(entry[2]) == entry[1]]
+        heapq.heapify(self._heap)
+
+    def _next_delay(self, now: float) -> Optional[float]:
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            if self._current.get(key) != seq:
+                heapq.heappop(self._heap)
+                continue
+            return max(0.0, deadline - now)
+        return None
+
+    async def run(self):
+        """Основной цикл: спим до ближайшего дедлайна"""
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self._next_delay(loop.time())
+            self._wakeup.clear()
+            if delay is None:
+                await self._wakeup.wait()
+                continue
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, key = heapq.heappop(self._heap)
+                if self._current.get(key) != seq:
+                    continue
+                del self._current[key]
+                task = asyncio.create_task(self._fire(key))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, key: Hashable):
+        try:
+            await self.on_expire(key)
+        except Exception as e:
+            logger.error(f"Ошибка обработки таймаута {key}: {e}")
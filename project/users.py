@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from sessions import SessionStore
+
+
+def _username_key(username: str) -> str:
+    return "username:" + username.lstrip("@").lower()
+
+
+class UserDirectory(BaseMiddleware):
+    """Справочник @username -> user_id по всем, кто писал боту
+
+    Пополняется из каждого входящего обновления и хранится в общем
+    хранилище сессий, так что его видят все воркеры и он переживает
+    перезапуск. В хранилище пишем только изменения.
+    """
+
+    def __init__(self, store: SessionStore, cache_size: int = 100000):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None and user.username and not user.is_bot:
+            await self.remember(user.username, user.id)
+        return await handler(event, data)
+
+    def _cached(self, key: str, user_id: int):
+        self._cache[key] = user_id
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def remember(self, username: str, user_id: int):
+        key = _username_key(username)
+        if self._cache.get(key) == user_id:
+            return
+        record, _ = await self.store.load(key)
+        if not record or record.get("id") != user_id:
+            await self.store.put(key, {"id": user_id})
+        self._cached(key, user_id)
+
+    async def resolve(self, username: str) -> Optional[int]:
+        """user_id по @username или None, если пользователь боту не писал"""
+        key = _username_key(username)
+        user_id = self._cache.get(key)
+        if user_id is not None:
+            return user_id
+        record, _ = await self.store.load(key)
+        if not record:
+            return None
+        self._cached(key, record["id"])
+        return record["id"]
@@ -0,0 +1,98 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Прием обновлений от Telegram по вебхуку на aiohttp
+
+    Обновление подтверждается сразу, а обрабатывается в фоне. Одновременно
+    обрабатывается не больше max_in_flight обновлений: когда мест нет,
+    ответ задерживается, и Telegram сам притормаживает отправку.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        path: str = "/webhook",
+        secret_token: Optional[str] = None,
+        max_in_flight: int = 100,
+        **kwargs: Any
+    ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.kwargs = kwargs
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько принятых обновлений еще обрабатывается"""
+        return len(self._tasks)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        # Байты, а не строки: compare_digest не сравнивает строки не из ASCII
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, "").encode(), self.secret_token.encode()
+        ):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: dict):
+        try:
+            await self.dispatcher.feed_raw_update(self.bot, update, **self.kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+        finally:
+            self._slots.release()
+
+    async def _on_startup(self, app: web.Application):
+        await self.dispatcher.emit_startup(bot=self.bot, **self.kwargs)
+
+    async def _on_shutdown(self, app: web.Application):
+        # Даем дообработать принятые обновления: Telegram их уже не пришлет
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+        await self.dispatcher.emit_shutdown(bot=self.bot, **self.kwargs)
+        await self.bot.session.close()
+
+    async def run(self, host: str, port: int):
+        """Запускаем сервер и работаем до отмены"""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logger.info(f"Вебхук слушает http://{host}:{port}{self.path}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from dictionary import normalize
+
+# Что вернуть, если данных нет: отличаем от "еще не искали"
+_MISSING = object()
+
+
+class WikiCache:
+    """Кеш описаний городов: LRU в памяти + SQLite на диске
+
+    Одновременные запросы одного города сливаются в один поход в сеть;
+    если все ожидающие его отменили, загрузка обрывается. Отрицательные
+    ответы (страницы нет) хранятся меньше положительных.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[str]]],
+        path: str,
+        size: int = 1000,
+        ttl: float = 7 * 24 * 3600,
+        negative_ttl: float = 3600
+    ):
+        self.fetch = fetch
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # joined - запросы, дождавшиеся уже идущей загрузки: это не попадания
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "joined": 0}
+        self._memory: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS wiki ("
+            "key TEXT PRIMARY KEY, extract TEXT, expires REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    async def get(self, city: str) -> Optional[str]:
+        """Описание города или None, если его нет в Википедии"""
+        key = normalize(city)
+        value = self._memory_get(key)
+        if value is not _MISSING:
+            self.stats["hits"] += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["joined"] += 1
+        else:
+            # Загрузка идет отдельной задачей: отмена одного из ожидающих
+            # не обрывает ее для остальных
+            task = asyncio.create_task(self._load(key, city))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Ждать больше некому: обрываем загрузку и освобождаем соединение.
+                    # Новые запросы города начнут свою, а не дождутся отмененной
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Ошибку получают ожидающие, здесь только помечаем
+
+    async def _load(self, key: str, city: str) -> Optional[str]:
+        row = await asyncio.to_thread(self._disk_get, key)
+        if row is not None and row[1] > time.time():
+            self.stats["disk_hits"] += 1
+            self._memory_put(key, row[0], row[1])
+            return row[0]
+
+        self.stats["misses"] += 1
+        value = await self.fetch(city)
+        expires = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        self._memory_put(key, value, expires)
+        await asyncio.to_thread(self._disk_put, key, value, expires)
+        return value
+
+    def _memory_get(self, key: str):
+        item = self._memory.get(key)
+        if item is None:
+            return _MISSING
+        if item[1] <= time.time():
+            del self._memory[key]
+            return _MISSING
+        self._memory.move_to_end(key)
+        return item[0]
+
+    def _memory_put(self, key: str, value: Optional[str], expires: float):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[Optional[str], float]]:
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT extract, expires FROM wiki WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_put(self, key: str, value: Optional[str], expires: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO wiki (key, extract, expires) VALUES (?, ?, ?)",
+                (key, value, expires)
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()